@@ -1,8 +1,10 @@
 import streamlit as st
 import utils
+import batch_utils
 import export_utils
 import secrets_utils
 import profile_utils
+import telemetry_utils
 import json
 import os
 import datetime
@@ -14,22 +16,35 @@ st.set_page_config(page_title="AI Cover Letter Generator v1.1", layout="wide", p
 # --- Session State Init ---
 DEFAULTS = {
     "api_key": "",
+    "fallback_keys": [],
     "provider": "OpenAI",
+    "base_url": "",
     "cover_letter_content": None,
-    "docx_data": None,
-    "pdf_data": None,
-    "latex_data": None,
-    "latex_code": None,
-    "session_usage": {"tokens": 0, "cost_est": 0.0, "chars": 0},
+    "exports": None,
+    "session_usage": {"tokens": 0, "cost_est": 0.0, "chars": 0, "cache_hits": 0, "tokens_saved": 0},
+    "telemetry": [],
     "master_password": None,
     "profile_name": "Default",
     "export_formats": ["Word", "PDF", "LaTeX"],
-    "gen_metadata": {}
+    "gen_metadata": {},
+    "batch_results": [],
+    "batch_cv_text": None
 }
 
 for k, v in DEFAULTS.items():
     if k not in st.session_state:
         st.session_state[k] = v
+if st.session_state.exports is None:
+    st.session_state.exports = export_utils.ExportManager()
+# Builds the PDF font asset once per process, before the first export.
+export_utils.preload_pdf_assets()
+
+# Download label -> (format id, file extension, mime, icon)
+EXPORT_FORMATS = {
+    "Word": ("docx", "docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", "📄"),
+    "PDF": ("pdf", "pdf", "application/pdf", "📑"),
+    "LaTeX": ("tex", "tex", "application/x-tex", "📜"),
+}
 
 # --- Helper: Secrets Loading ---
 def get_secrets_status():
@@ -37,8 +52,17 @@ def get_secrets_status():
     pwd = st.session_state.master_password
     return secrets_utils.load_secrets(pwd)
 
+def api_keys():
+    """Selected key first, then the provider's other vault keys for failover."""
+    key = st.session_state.api_key
+    return list(dict.fromkeys([key] + [k for k in st.session_state.fallback_keys if k]))
+
 def update_exports():
-    """Regenerates export files when text is edited."""
+    """
+    Records the edited letter for export. Nothing renders here: the selected
+    formats are queued on the background worker, and "Prepare" renders a format
+    the worker hasn't reached (unchanged content is memoized).
+    """
     if not st.session_state.gen_metadata:
         return
         
@@ -50,15 +74,32 @@ def update_exports():
         "hr_info": meta.get("hr_info", {})
     }
     
-    formats = st.session_state.export_formats
-    if "Word" in formats:
-        st.session_state.docx_data = export_utils.create_docx(full_data)
-    if "PDF" in formats:
-        st.session_state.pdf_data = export_utils.create_pdf(full_data)
-    if "LaTeX" in formats:
-        data, code = export_utils.create_latex(full_data)
-        st.session_state.latex_data = data
-        st.session_state.latex_code = code
+    prefetch = [EXPORT_FORMATS[f][0] for f in st.session_state.export_formats if f in EXPORT_FORMATS]
+    st.session_state.exports.update(full_data, prefetch=prefetch)
+
+def record_usage(new_u, error=None, job_id=None):
+    """Adds one generation's usage to the sidebar totals and the telemetry log."""
+    u_clean = st.session_state.session_usage
+    u_clean['tokens'] += new_u.get("total_tokens", 0)
+    u_clean['cost_est'] += new_u.get("cost_est") or 0.0
+    u_clean['chars'] += new_u.get("input_chars", 0) + new_u.get("output_chars", 0)
+    u_clean['cache_hits'] = u_clean.get('cache_hits', 0) + len(new_u.get("cache_hits", []))
+    u_clean['tokens_saved'] = u_clean.get('tokens_saved', 0) + new_u.get("compaction", {}).get("saved_tokens", 0)
+    if new_u:
+        record = telemetry_utils.record_from_result({"ok": error is None, "error": error, "usage": new_u},
+                                                    st.session_state.provider, job_id)
+        st.session_state.telemetry.append(record)
+
+def show_result(result, profile, letter_date_str):
+    """Loads a generated letter into the editor and builds the selected exports."""
+    st.session_state.cover_letter_content = result["text"]
+    # Save Metadata for editing
+    st.session_state.gen_metadata = {
+        "user_info": profile,
+        "date_str": letter_date_str,
+        "hr_info": result.get("hr_info_debug", {})
+    }
+    update_exports()
 
 # --- Sidebar ---
 with st.sidebar:
@@ -88,6 +129,13 @@ with st.sidebar:
             st.success("🟢 API Key: Active")
         else:
             st.warning("🔴 API Key: Missing")
+        if secrets_status["is_encrypted"] and st.session_state.master_password:
+            if st.button("🔒 Lock Vault"):
+                secrets_utils.lock_vault(st.session_state.master_password)
+                st.session_state.master_password = None
+                st.session_state.api_key = ""
+                st.session_state.fallback_keys = []
+                st.rerun()
 
     st.divider()
     
@@ -98,6 +146,21 @@ with st.sidebar:
         st.write(f"**Tokens**: ~{u['tokens']}")
     if u['chars'] > 0:
         st.write(f"**Chars**: ~{u['chars']}")
+    if u.get('cache_hits', 0) > 0:
+        st.write(f"**Cached Steps**: {u['cache_hits']}")
+    if u.get('tokens_saved', 0) > 0:
+        st.write(f"**Trimmed from prompts**: ~{u['tokens_saved']} tokens")
+    if u.get('cost_est', 0) > 0:
+        st.write(f"**Est. Cost**: ~${u['cost_est']:.4f}")
+    if st.session_state.telemetry:
+        summary = telemetry_utils.summarize_records(st.session_state.telemetry)
+        with st.expander("⏱️ Step Latency"):
+            for step, row in summary["steps"].items():
+                wall = f"{row['mean_wall']:.2f}s" if row["mean_wall"] is not None else "cached"
+                ttfb = f", first byte {row['mean_ttfb']:.2f}s" if row["mean_ttfb"] is not None else ""
+                st.caption(f"**{step}**: {wall}{ttfb} · {row['tokens']} tok · {row['cache_hits']}/{row['runs']} cached")
+            st.download_button("📥 Telemetry (JSONL)", telemetry_utils.export_records(st.session_state.telemetry),
+                               file_name="telemetry.jsonl", mime="application/json")
         
     st.divider()
     if st.button("🔄 Reset Session"):
@@ -142,6 +205,17 @@ with tab_settings:
         # Reverse map
         selected_model_name = [k for k, v in model_map.items() if v == selected_display][0]
         
+        if provider == "OpenAI":
+            with st.expander("OpenAI-compatible server (optional)"):
+                st.session_state.base_url = st.text_input(
+                    "Base URL", value=st.session_state.base_url, placeholder="http://localhost:8765/v1",
+                    help="Send requests to a self-hosted or local stub server instead of api.openai.com."
+                ).strip()
+                custom_model = st.text_input("Model name override", value="").strip()
+                if custom_model:
+                    selected_model_name = custom_model
+        base_url = (st.session_state.base_url or None) if provider == "OpenAI" else None
+        
         st.markdown("---")
         
         # Secrets Management
@@ -176,6 +250,7 @@ with tab_settings:
                 save_check = st.checkbox("Save to Vault")
                 
                 current_api_key = new_key_val
+                st.session_state.fallback_keys = []
                 if save_check and new_key_val:
                     if secrets["is_encrypted"]:
                         if st.button("💾 Save Encrypted"):
@@ -192,6 +267,8 @@ with tab_settings:
             else:
                 current_api_key = key_options[selection]
                 st.session_state.api_key = current_api_key
+                # Throttled or rejected calls move on to the other saved keys
+                st.session_state.fallback_keys = list(key_options.values())
                 st.info(f"Using: {selection}")
                 
             # Encryption Setup
@@ -267,12 +344,16 @@ with tab_settings:
         if os.path.exists(secrets_utils.SECRETS_FILE):
              try: os.remove(secrets_utils.SECRETS_FILE)
              except: pass
+        secrets_utils.clear_key_cache()
             
         # 2. Delete Profiles
         import shutil
         if os.path.exists(profile_utils.PROFILES_DIR):
             try: shutil.rmtree(profile_utils.PROFILES_DIR)
             except: pass
+        # In-memory caches would otherwise survive (and the Step 1 cache be written back to disk)
+        utils.clear_caches()
+        export_utils.clear_caches()
             
         # 3. Clear Session
         st.session_state.clear()
@@ -287,89 +368,145 @@ with tab_generator:
     
     # Reload profile just in case
     live_profile = profile_utils.load_profile(st.session_state.profile_name)
-    user_info = {
-        "name": live_profile.get("full_name", ""),
-        "email": live_profile.get("email", ""),
-        "phone": live_profile.get("phone", ""),
-        "linkedin": live_profile.get("linkedin", ""),
-        "address": live_profile.get("address", "")
-    }
+    user_info = profile_utils.user_info_from_profile(live_profile)
 
     col_gen_1, col_gen_2 = st.columns([1, 1])
     
     with col_gen_1:
         st.subheader("Input")
         uploaded_file = st.file_uploader("1. Upload Resume (PDF)", type="pdf")
-        job_description = st.text_area("2. Paste Job Description", height=300)
+        gen_mode = st.radio("Mode", ["Single", "Batch"], horizontal=True)
+        if gen_mode == "Single":
+            job_description = st.text_area("2. Paste Job Description", height=300)
+        else:
+            batch_text = st.text_area("2. Paste Job Descriptions (separate with a line containing ---)", height=300)
+            batch_files = st.file_uploader("Or upload job files (.txt, .jsonl)", type=["txt", "jsonl"], accept_multiple_files=True)
+            batch_concurrency = st.slider("Parallel generations", 1, 8, batch_utils.BATCH_CONCURRENCY)
         
         today = datetime.date.today()
         letter_date = st.date_input("3. Date", value=today)
         date_str = letter_date.strftime("%B %d, %Y")
         
+        fresh_draft = st.checkbox("Write a fresh draft", value=False,
+                                  help="By default, re-generating for the same resume and JD reuses the previous analysis and draft, only updating the header.")
+        chain_mode = st.selectbox("Execution plan", utils.CHAIN_MODES,
+                                  help="'pipelined' matches your resume against the raw JD while the JD is being analysed, saving one round trip. "
+                                       "'fused' does everything in one structured call (cheapest), falling back to the full chain if the reply is malformed.")
         generate_btn = st.button("✨ Generate", type="primary", use_container_width=True)
 
     with col_gen_2:
         st.subheader("Result")
         
-        if generate_btn:
+        if generate_btn and gen_mode == "Single":
              if not st.session_state.api_key:
                  st.error("❌ Missing API Key in Settings.")
              elif not uploaded_file or not job_description:
                  st.error("❌ Missing Resume or JD.")
              else:
                  with st.spinner("Analyzing & Writing..."):
-                     # Extract Text
-                     cv_text = utils.extract_text_from_pdf(uploaded_file)
+                     # Extract Text (cached per file content)
+                     pdf_info = utils.extract_pdf(uploaded_file)
+                     cv_text = pdf_info["text"] if pdf_info else None
+                     if pdf_info and (pdf_info.get("skipped_pages") or pdf_info.get("truncated")):
+                         st.warning(
+                             f"Resume read partially: {len(pdf_info.get('skipped_pages', []))} unreadable page(s) skipped"
+                             + (", long file truncated." if pdf_info.get("truncated") else ".")
+                         )
                      
                      if cv_text:
                          prov_key_norm = "Gemini" if provider == "Google Gemini" else "OpenAI"
                          
-                         result = utils.generate_cover_letter(
-                             cv_text, job_description, st.session_state.api_key, 
-                             prov_key_norm, user_info, selected_model_name, date_str
+                         # Stream the draft step so the letter appears token-by-token
+                         stream = utils.generate_cover_letter_stream(
+                             cv_text, job_description, api_keys(), 
+                             prov_key_norm, user_info, selected_model_name, date_str,
+                             reuse_draft=not fresh_draft, mode=chain_mode, base_url=base_url
                          )
+                         stream_box = st.empty()
+                         with stream_box.container():
+                             st.write_stream(stream)
+                         stream_box.empty()
+                         result = stream.result or {"ok": False, "error": "Generation was interrupted."}
                          
                          if result["ok"]:
                              st.success("✅ Generated!")
-                             st.session_state.cover_letter_content = result["text"]
-                             
-                             # Update Usage
-                             u_clean = st.session_state.session_usage
-                             new_u = result.get("usage", {})
-                             u_clean['tokens'] += new_u.get("total_tokens", 0)
-                             u_clean['chars'] += new_u.get("input_chars", 0) + new_u.get("output_chars", 0)
-                             
-                             # Generate Exports
-                             full_data = {
-                                 "body": result["text"],
-                                 "user_info": live_profile,
-                                 "date_str": date_str,
-                                 "hr_info": result.get("hr_info_debug", {})
-                             }
-                             
-                             # Save Metadata for editing
-                             st.session_state.gen_metadata = {
-                                 "user_info": live_profile,
-                                 "date_str": date_str,
-                                 "hr_info": result.get("hr_info_debug", {})
-                             }
-
-                             # Only generate selected
-                             formats = st.session_state.export_formats
-                             if "Word" in formats:
-                                 st.session_state.docx_data = export_utils.create_docx(full_data)
-                             if "PDF" in formats:
-                                 st.session_state.pdf_data = export_utils.create_pdf(full_data)
-                             if "LaTeX" in formats:
-                                 data, code = export_utils.create_latex(full_data)
-                                 st.session_state.latex_data = data
-                                 st.session_state.latex_code = code
-                                 
+                             match = result.get("usage", {}).get("match") or {}
+                             if match.get("score") is not None:
+                                 st.caption(f"Skills found in resume: {match['score']}%"
+                                            + (f" (missing: {', '.join(match['missing'])})" if match["missing"] else ""))
+                             record_usage(result.get("usage", {}))
+                             show_result(result, live_profile, date_str)
                          else:
+                             record_usage(result.get("usage", {}), error=result["error"])
                              st.error(f"Failed: {result['error']}")
                      else:
                          st.error("Failed to read PDF.")
 
+        # --- Batch Mode ---
+        def run_batch_into_table(cv_text, jobs):
+            """Runs jobs and refreshes the results table as each one finishes."""
+            prov_key_norm = "Gemini" if provider == "Google Gemini" else "OpenAI"
+            done = {r["id"]: r for r in st.session_state.batch_results}
+            table = st.empty()
+            progress = st.progress(0.0)
+            for i, item in enumerate(batch_utils.run_batch(
+                cv_text, jobs, api_keys(), prov_key_norm, user_info,
+                selected_model_name, date_str, concurrency=batch_concurrency,
+                reuse_draft=not fresh_draft, mode=chain_mode, base_url=base_url
+            ), start=1):
+                done[item["id"]] = item
+                record_usage(item.get("usage", {}), error=item["error"], job_id=item["id"])
+                st.session_state.batch_results = list(done.values())
+                table.dataframe(batch_utils.summarize(st.session_state.batch_results), use_container_width=True)
+                progress.progress(i / len(jobs))
+            progress.empty()
+            table.empty()
+
+        if generate_btn and gen_mode == "Batch":
+            jobs = batch_utils.parse_pasted_jobs(batch_text)
+            try:
+                for f in batch_files or []:
+                    if f.name.endswith(".jsonl"):
+                        jobs += batch_utils.parse_jsonl_jobs(f.getvalue().decode("utf-8").splitlines(), source=f.name)
+                    else:
+                        jobs.append({"id": f.name[:-4], "job_description": f.getvalue().decode("utf-8")})
+            except ValueError as e:
+                st.error(f"❌ {e}")
+                jobs = []
+
+            if not st.session_state.api_key:
+                st.error("❌ Missing API Key in Settings.")
+            elif not uploaded_file or not jobs:
+                st.error("❌ Missing Resume or Job Descriptions.")
+            else:
+                # The CV is extracted once and shared by every job
+                cv_text = utils.extract_text_from_pdf(uploaded_file)
+                if cv_text:
+                    st.session_state.batch_results = []
+                    st.session_state.batch_cv_text = cv_text
+                    run_batch_into_table(cv_text, jobs)
+                else:
+                    st.error("Failed to read PDF.")
+
+        if gen_mode == "Batch" and st.session_state.batch_results:
+            results = st.session_state.batch_results
+            ok_count = sum(1 for r in results if r["status"] == "ok")
+            st.markdown(f"### Batch Results ({ok_count}/{len(results)} ok)")
+            st.dataframe(batch_utils.summarize(results), use_container_width=True)
+
+            failed = [r["job"] for r in results if r["status"] != "ok"]
+            if failed and st.session_state.batch_cv_text and st.button(f"🔁 Retry {len(failed)} failed"):
+                run_batch_into_table(st.session_state.batch_cv_text, failed)
+                st.rerun()
+
+            ok_ids = [r["id"] for r in results if r["status"] == "ok"]
+            if ok_ids:
+                open_id = st.selectbox("Open a result in the editor", ok_ids)
+                if st.button("📝 Open"):
+                    chosen = next(r for r in results if r["id"] == open_id)
+                    show_result(chosen["result"], live_profile, chosen["job"].get("date_str", date_str))
+                    st.rerun()
+
         # Persistent View
         if st.session_state.cover_letter_content:
             # Editable Preview
@@ -387,31 +524,23 @@ with tab_generator:
                 
             # Downloads
             dl_cols = st.columns(3)
-            formats = st.session_state.export_formats
-            
-            if "Word" in formats and st.session_state.docx_data:
-                dl_cols[0].download_button(
-                    label="Download .docx",
-                    data=st.session_state.docx_data,
-                    file_name="cover_letter.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    icon="📄"
-                )
             
-            if "PDF" in formats and st.session_state.pdf_data:
-                dl_cols[1].download_button(
-                    label="Download .pdf",
-                    data=st.session_state.pdf_data,
-                    file_name="cover_letter.pdf",
-                    mime="application/pdf",
-                    icon="📑"
-                )
-                
-            if "LaTeX" in formats and st.session_state.latex_data:
-                dl_cols[2].download_button(
-                    label="Download .tex",
-                    data=st.session_state.latex_data,
-                    file_name="cover_letter.tex",
-                    mime="application/x-tex",
-                    icon="📜"
-                )
+            exports = st.session_state.exports
+            for col, label in zip(dl_cols, EXPORT_FORMATS):
+                if exports.data is None:
+                    continue
+                fmt, ext, mime, icon = EXPORT_FORMATS[label]
+                # Downloads only for rendered bytes, so a rerun never blocks on a render
+                if exports.ready(fmt):
+                    col.download_button(
+                        label=f"Download .{ext}",
+                        data=exports.get(fmt),
+                        file_name=f"cover_letter.{ext}",
+                        mime=mime,
+                        icon=icon
+                    )
+                elif col.button(f"Prepare .{ext}", icon=icon, key=f"prepare_{fmt}"):
+                    # Not rendered yet (worker still busy, or format not selected): render it
+                    # now, joining the worker's render if it is in flight
+                    exports.get(fmt)
+                    st.rerun()
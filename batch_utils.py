@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import re
+import time
+
+import scheduler_utils
+import utils
+
+# Default fan-out for one batch and per-provider request budgets (generations/minute).
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+PROVIDER_RATE_LIMITS = {
+    "OpenAI": float(os.getenv("OPENAI_RATE_LIMIT", "60")),
+    "Gemini": float(os.getenv("GEMINI_RATE_LIMIT", "15")),
+}
+
+# --- Job Loading ---
+
+def _job(job_id, job_description, **extra):
+    job = {"id": str(job_id), "job_description": job_description.strip()}
+    job.update({k: v for k, v in extra.items() if v})
+    return job
+
+def parse_pasted_jobs(text):
+    """Splits pasted text into jobs on lines containing only '---'."""
+    chunks = re.split(r"^\s*-{3,}\s*$", text or "", flags=re.MULTILINE)
+    return [_job(f"JD {i}", c) for i, c in enumerate((c for c in chunks if c.strip()), start=1)]
+
+def parse_jsonl_jobs(lines, source="jsonl"):
+    """
+    One JSON object per line: {"id"?, "job_description" | "jd", "date_str"?}.
+    Blank lines are ignored; malformed lines raise ValueError with the line number.
+    """
+    jobs = []
+    for n, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{source}:{n}: invalid JSON ({e})")
+        jd = row.get("job_description") or row.get("jd")
+        if not jd:
+            raise ValueError(f"{source}:{n}: missing 'job_description'")
+        jobs.append(_job(row.get("id", f"{source}:{n}"), jd, date_str=row.get("date_str")))
+    return jobs
+
+def load_jobs_from_folder(path):
+    """Every .txt file in a folder becomes one job, named after the file."""
+    jobs = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".txt"):
+            with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+                jobs.append(_job(name[:-4], f.read()))
+    return jobs
+
+def load_jobs_from_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_jsonl_jobs(f, source=os.path.basename(path))
+
+# --- Rate Limiting ---
+
+_limiters = {}
+
+def _get_limiter(provider):
+    # asyncio primitives belong to one loop; batches run on utils' shared loop.
+    loop = asyncio.get_running_loop()
+    key = (provider, id(loop))
+    if key not in _limiters:
+        _limiters[key] = scheduler_utils.RateLimiter(PROVIDER_RATE_LIMITS.get(provider, 30))
+    return _limiters[key]
+
+# --- Batch Engine ---
+
+async def _run_one(job, cv_text, api_key, provider, user_info, model_name, date_str, retries, **options):
+    limiter = _get_limiter(provider)
+    start = time.perf_counter()
+    result = None
+    for attempt in range(1, retries + 2):
+        await limiter.acquire()
+        result = await utils.generate_cover_letter_async(
+            cv_text, job["job_description"], api_key, provider, user_info,
+            model_name, job.get("date_str", date_str), **options
+        )
+        if result.get("ok"):
+            break
+    return {
+        "id": job["id"],
+        "status": "ok" if result.get("ok") else "error",
+        "attempts": attempt,
+        "elapsed": round(time.perf_counter() - start, 2),
+        "usage": result.get("usage", {}),
+        "error": result.get("error"),
+        "result": result,
+        "job": job,
+    }
+
+async def run_batch_async(cv_text, jobs, api_key, provider, user_info, model_name=None, date_str="[Date]",
+                          concurrency=None, retries=1, **options):
+    """
+    Generates one letter per job for a single CV, at most `concurrency` at a time
+    and within the provider's rate limit. Yields per-item result dicts as they finish:
+    {"id", "status", "attempts", "elapsed", "usage", "error", "result", "job"}.
+    The CV text is shared, so Step 2/draft caches apply per (CV, JD) pair.
+    """
+    semaphore = asyncio.Semaphore(concurrency or BATCH_CONCURRENCY)
+
+    async def bounded(job):
+        async with semaphore:
+            try:
+                return await _run_one(job, cv_text, api_key, provider, user_info, model_name, date_str, retries, **options)
+            except Exception as e:
+                return {"id": job["id"], "status": "error", "attempts": 1, "elapsed": 0.0,
+                        "usage": {}, "error": str(e), "result": None, "job": job}
+
+    tasks = [asyncio.ensure_future(bounded(job)) for job in jobs]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def run_batch(cv_text, jobs, api_key, provider, user_info, model_name=None, date_str="[Date]",
+              concurrency=None, retries=1, **options):
+    """Blocking generator over run_batch_async (results arrive in completion order)."""
+    events = run_batch_async(cv_text, jobs, api_key, provider, user_info, model_name, date_str,
+                             concurrency, retries, **options)
+    finished = False
+    try:
+        while True:
+            try:
+                yield utils.run_sync(events.__anext__())
+            except StopAsyncIteration:
+                finished = True
+                return
+    finally:
+        if not finished:
+            utils.run_sync(events.aclose())
+
+def summarize(results):
+    """One row per item for display: id, status, seconds, tokens, est. cost, skills match %, error."""
+    rows = []
+    for r in results:
+        usage = r.get("usage") or {}
+        rows.append({
+            "id": r["id"],
+            "status": r["status"],
+            "attempts": r.get("attempts", 1),
+            "seconds": r.get("elapsed", 0.0),
+            "tokens": usage.get("total_tokens", 0),
+            "chars": usage.get("input_chars", 0) + usage.get("output_chars", 0),
+            "cost": usage.get("cost_est"),
+            "match": (usage.get("match") or {}).get("score"),
+            "cached": ", ".join(usage.get("cache_hits", [])),
+            "error": r.get("error") or "",
+        })
+    return rows
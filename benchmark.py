@@ -0,0 +1,316 @@
+"""
+Timing/memory benchmarks for the hot paths.
+
+    python -m benchmark                      # full suite -> benchmarks/results-<commit>.json
+    python -m benchmark --quick --only pdf,export
+    python -m benchmark --compare benchmarks/results-abc123.json
+
+Each case reports min/median/mean/max seconds over `repeat` runs plus the
+tracemalloc peak of one extra run. The results file is JSON so two commits
+can be diffed with --compare.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+import batch_utils
+import export_utils
+import scheduler_utils
+import secrets_utils
+import stub_server
+import utils
+
+RESULTS_DIR = "benchmarks"
+GROUPS = ("pdf", "export", "font", "bulk", "secrets", "chain")
+
+# Regressions above this ratio (new median / old median) are flagged by --compare.
+REGRESSION_THRESHOLD = 1.2
+
+USER_INFO = {"name": "Bench User", "email": "bench@example.com", "phone": "555-0100",
+             "linkedin": "linkedin.com/in/bench", "address": "1 Bench St"}
+
+PARAGRAPH = ("I led a team of five engineers to rebuild our **data pipeline**, cutting nightly "
+             "processing time by 60% while improving test coverage and on-call load. ")
+
+# --- Harness ---
+
+def measure(fn, repeat=5, warmup=1, setup=None):
+    """
+    Times fn() `repeat` times (setup() runs untimed before each call) and
+    records the tracemalloc peak of one more call.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "repeat": repeat,
+        "min": round(min(samples), 6),
+        "median": round(statistics.median(samples), 6),
+        "mean": round(statistics.mean(samples), 6),
+        "max": round(max(samples), 6),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def _case(name, params, stats, **extra):
+    row = {"name": name, "params": params, "stats": stats}
+    row.update(extra)
+    print(f"{name:<28} {json.dumps(params):<36} median {stats['median'] * 1000:9.2f} ms  peak {stats['peak_kb']:>9.1f} KB", file=sys.stderr)
+    return row
+
+# --- Fixtures ---
+
+def make_pdf(pages, lines_per_page=40):
+    """Synthetic text PDF with `pages` pages (fpdf2, the PDF exporter's dependency)."""
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.set_font("Helvetica", size=10)
+    for p in range(pages):
+        pdf.add_page()
+        for i in range(lines_per_page):
+            pdf.cell(0, 6, f"Page {p + 1} line {i + 1}: Python, AWS, Kubernetes, data pipelines, mentoring.", new_x="LMARGIN", new_y="NEXT")
+    return bytes(pdf.output())
+
+def make_letter(paragraphs):
+    header = "\n".join(utils._header_lines(USER_INFO, "January 1, 2026"))
+    bullets = "\n".join(f"* Achievement {i}: shipped feature {i}" for i in range(paragraphs // 4 + 1))
+    body = "\n\n".join(PARAGRAPH * 3 for _ in range(paragraphs))
+    return f"{header}\n\nJane Smith\nAcme\nNYC\n\nDear Jane Smith,\n\n{body}\n\n{bullets}\n\nSincerely,\nBench User"
+
+# --- Groups ---
+
+def bench_pdf(quick=False):
+    rows = []
+    for pages in ((1, 10, 50) if quick else (1, 10, 25, 50, 100, 200)):
+        pdf = make_pdf(pages)
+        # Lift the upload caps so every size is extracted in full (200 > PDF_MAX_PAGES)
+        with mock.patch.object(utils, "PDF_MAX_PAGES", pages), \
+             mock.patch.object(utils, "PDF_MAX_CHARS", sys.maxsize), \
+             mock.patch.object(utils, "PDF_DISK_CACHE", False):
+            stats = measure(lambda: utils.extract_text_from_pdf(io.BytesIO(pdf)),
+                            repeat=2 if quick else 5, setup=utils._pdf_cache.clear)
+            utils._pdf_cache.clear()
+            extracted = len(utils.extract_pdf(io.BytesIO(pdf))["page_offsets"])
+        utils._pdf_cache.clear()
+        rows.append(_case("extract_text_from_pdf", {"pages": pages}, stats, bytes=len(pdf), extracted_pages=extracted))
+    return rows
+
+def bench_export(quick=False):
+    rows = []
+    exporters = {
+        "create_docx": export_utils.create_docx,
+        "create_pdf": export_utils.create_pdf,
+        "create_latex": export_utils.create_latex,
+    }
+    for paragraphs in ((3, 12) if quick else (3, 12, 48, 192)):
+        data = {"body": make_letter(paragraphs), "user_info": USER_INFO, "date_str": "January 1, 2026",
+                "hr_info": {"company": "Acme", "manager": "Jane Smith", "address": "NYC"}}
+        for name, fn in exporters.items():
+            stats = measure(lambda: fn(data), repeat=3 if quick else 10)
+            rows.append(_case(name, {"paragraphs": paragraphs, "chars": len(data["body"])}, stats))
+    return rows
+
+# Used by bench_pdf_font when assets/fonts/DejaVuSans.ttf is not checked out.
+FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/DejaVuSans.ttf",
+)
+
+def bench_pdf_font(quick=False):
+    """Per-letter create_pdf with the TrueType font: full file every render vs the cached core subset."""
+    font = next((p for p in (export_utils.PDF_FONT_PATH,) + FONT_CANDIDATES if os.path.exists(p)), None)
+    if font is None:
+        print("bench_pdf_font: no DejaVuSans.ttf found, skipped", file=sys.stderr)
+        return []
+    rows = []
+    data = {"body": make_letter(6), "user_info": USER_INFO, "date_str": "January 1, 2026", "hr_info": {}}
+    with mock.patch.object(export_utils, "PDF_FONT_PATH", font):
+        export_utils.preload_pdf_assets()
+        for cached in (False, True):
+            with mock.patch.object(export_utils, "PDF_FONT_CACHE", cached):
+                stats = measure(lambda: export_utils.create_pdf(data), repeat=3 if quick else 10)
+            rows.append(_case("create_pdf", {"font": "core-cache" if cached else "full", "paragraphs": 6}, stats))
+    return rows
+
+def bench_bulk_export(quick=False):
+    """export_letters over a batch of letters in every format: inline vs the process pool, into a zip."""
+    rows = []
+    count = 12 if quick else 60
+    data = {"body": make_letter(6), "user_info": USER_INFO, "date_str": "January 1, 2026", "hr_info": {}}
+    formats = list(export_utils.RENDERERS)
+    with tempfile.TemporaryDirectory() as tmp:
+        # The pool case needs EXPORT_WORKERS > 1 (defaults to min(4, cpu count))
+        for parallel in ((False, True) if export_utils.EXPORT_WORKERS > 1 else (False,)):
+            last = {}
+            def run():
+                letters = ((f"job{i}", data) for i in range(count))
+                export = export_utils.export_letters(letters, formats, os.path.join(tmp, "letters.zip"), parallel=parallel)
+                for _ in export:
+                    pass
+                last["stats"] = export.stats
+            stats = measure(run, repeat=2 if quick else 3)
+            mode = f"pool-{export_utils.EXPORT_WORKERS}" if parallel else "inline"
+            rows.append(_case("export_letters", {"letters": count, "mode": mode}, stats,
+                              letters_per_sec=round(count / stats["median"], 2), bytes=last["stats"]["bytes"]))
+    return rows
+
+def bench_secrets(quick=False):
+    rows = []
+    repeat = 3 if quick else 10
+    secrets = {"openai_keys": [{"name": f"k{i}", "key": f"sk-{i:040d}"} for i in range(5)], "gemini_keys": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_path = os.path.join(tmp, "plain.json")
+        with open(plain_path, "w") as f:
+            json.dump(secrets, f)
+        with mock.patch.object(secrets_utils, "SECRETS_FILE", plain_path):
+            rows.append(_case("load_secrets", {"store": "plain"}, measure(secrets_utils.load_secrets, repeat)))
+
+        enc_path = os.path.join(tmp, "enc.json")
+        with open(enc_path, "w") as f:
+            json.dump(secrets_utils.encrypt_data(secrets, "bench-pw"), f)
+        with mock.patch.object(secrets_utils, "SECRETS_FILE", enc_path):
+            load = lambda: secrets_utils.load_secrets("bench-pw")
+            # Cold: PBKDF2 on every call; warm: derived key served from the in-process cache
+            rows.append(_case("load_secrets", {"store": "encrypted", "key_cache": "cold"},
+                              measure(load, repeat, setup=secrets_utils.clear_key_cache)))
+            rows.append(_case("load_secrets", {"store": "encrypted", "key_cache": "warm"}, measure(load, repeat)))
+        secrets_utils.clear_key_cache()
+    return rows
+
+def bench_chain(quick=False):
+    """The full pipeline over HTTP against the local stub (no API spend)."""
+    rows = []
+    latency = 0.05
+    server = stub_server.start_stub_server(latency=latency, completion_tokens=250)
+    # The stub has no rate limits; keep the per-key budget out of the timings.
+    scheduler_utils._key_limiters.clear()
+    key_limits = mock.patch.dict(scheduler_utils.KEY_RATE_LIMITS, {"OpenAI": 1e6})
+    key_limits.start()
+    try:
+        cv_text = utils.extract_text_from_pdf(io.BytesIO(make_pdf(2)))
+        jd = "Senior Python Engineer at Acme.\n\nRequirements:\n- Python\n- AWS\n- Kubernetes"
+        for mode in utils.CHAIN_MODES:
+            generate = lambda: utils.generate_cover_letter(
+                cv_text, jd, "sk-local", "OpenAI", USER_INFO, "stub-model", "January 1, 2026",
+                mode=mode, use_cache=False, base_url=server.url
+            )
+            rows.append(_case("generate_cover_letter", {"mode": mode, "stub_latency": latency},
+                              measure(generate, repeat=2 if quick else 5)))
+
+        jobs = [{"id": str(i), "job_description": f"{jd}\nTeam {i}"} for i in range(8 if quick else 32)]
+        with mock.patch.dict(batch_utils.PROVIDER_RATE_LIMITS, {"OpenAI": 1e6}):
+            run = lambda: list(batch_utils.run_batch(cv_text, jobs, "sk-local", "OpenAI", USER_INFO, "stub-model",
+                                                     concurrency=8, use_cache=False, base_url=server.url))
+            stats = measure(run, repeat=1 if quick else 3, warmup=0)
+        rows.append(_case("run_batch", {"jobs": len(jobs), "concurrency": 8, "stub_latency": latency}, stats,
+                          letters_per_sec=round(len(jobs) / stats["median"], 2)))
+    finally:
+        key_limits.stop()
+        scheduler_utils._key_limiters.clear()
+        server.stop()
+    return rows
+
+BENCHMARKS = {"pdf": bench_pdf, "export": bench_export, "font": bench_pdf_font, "bulk": bench_bulk_export, "secrets": bench_secrets, "chain": bench_chain}
+
+# --- Results ---
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+def run_suite(groups=GROUPS, quick=False):
+    results = []
+    for group in groups:
+        for row in BENCHMARKS[group](quick=quick):
+            row["group"] = group
+            results.append(row)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+def _key(row):
+    return (row["name"], json.dumps(row["params"], sort_keys=True))
+
+def compare_results(old, new, threshold=REGRESSION_THRESHOLD):
+    """Rows present in both runs with their median ratio; ratio > threshold is a regression."""
+    baseline = {_key(r): r for r in old["results"]}
+    rows = []
+    for row in new["results"]:
+        before = baseline.get(_key(row))
+        if not before or not before["stats"]["median"]:
+            continue
+        ratio = row["stats"]["median"] / before["stats"]["median"]
+        rows.append({"name": row["name"], "params": row["params"], "old": before["stats"]["median"],
+                     "new": row["stats"]["median"], "ratio": round(ratio, 3), "regression": ratio > threshold})
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark extraction, exports, secrets and the chain.")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"Comma-separated subset of: {','.join(GROUPS)}")
+    parser.add_argument("--quick", action="store_true", help="Fewer sizes and repeats (smoke run)")
+    parser.add_argument("--out", default=None, help="Results file (default: benchmarks/results-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Unknown group(s): {', '.join(unknown)}")
+
+    report = run_suite(groups, quick=args.quick)
+    out = args.out or os.path.join(RESULTS_DIR, f"results-{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = 0
+        for row in compare_results(old, report):
+            flag = "  REGRESSION" if row["regression"] else ""
+            regressions += row["regression"]
+            print(f"{row['name']:<28} {json.dumps(row['params']):<36} {row['old'] * 1000:9.2f} -> {row['new'] * 1000:9.2f} ms  x{row['ratio']:.2f}{flag}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import profile_utils
+
+# On-disk cache tiers live next to the profiles so a factory reset clears them too.
+CACHE_DIR = os.path.join(profile_utils.PROFILES_DIR, ".cache")
+
+# --- Hashing ---
+
+def hash_bytes(data: bytes) -> str:
+    """Full SHA-256 hex digest of raw bytes (content addressing)."""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_text(text: str) -> str:
+    return hash_bytes((text or "").encode("utf-8"))
+
+def fingerprint(secret: str) -> str:
+    """Short, non-reversible identifier for an API key. Safe to log or persist."""
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:16]
+
+# --- In-memory tier ---
+
+class LRUCache:
+    """
+    Small thread-safe LRU with an optional TTL (seconds).
+    Shared by Streamlit sessions, so every access takes the lock.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+        return [(k, v) for k, (v, _) in evicted]
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        with self._lock:
+            return [(k, v) for k, (v, _) in self._data.items()]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+_MISSING = object()
+
+class PersistentLRU(LRUCache):
+    """
+    LRUCache mirrored to a JSON snapshot in CACHE_DIR.
+    Keys must be strings and values JSON-serialisable. The snapshot is read
+    lazily on first access and rewritten (in LRU order) after every set.
+    """
+
+    def __init__(self, name, maxsize=256):
+        super().__init__(maxsize=maxsize)
+        self.name = name
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        for key, value in load_snapshot(self.name).get("entries", []):
+            super().set(key, value)
+
+    def get(self, key, default=None):
+        self._ensure_loaded()
+        return super().get(key, default)
+
+    def set(self, key, value):
+        self._ensure_loaded()
+        evicted = super().set(key, value)
+        save_snapshot(self.name, {"entries": self.items()})
+        return evicted
+
+    def pop(self, key, default=None):
+        self._ensure_loaded()
+        value = super().pop(key, default)
+        save_snapshot(self.name, {"entries": self.items()})
+        return value
+
+    def reload(self):
+        """Drops the in-memory copy; the next access re-reads the snapshot."""
+        super().clear()
+        self._loaded = False
+
+# --- On-disk tier ---
+
+def cache_path(*parts):
+    return os.path.join(CACHE_DIR, *parts)
+
+def atomic_write_bytes(path, data: bytes):
+    """Writes via a temp file + os.replace so readers never see partial files."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_snapshot(name):
+    """Loads a JSON snapshot from CACHE_DIR. Returns {} if missing or unreadable."""
+    path = cache_path(name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        print(f"Cache snapshot error ({name}): {e}")
+        return {}
+
+def save_snapshot(name, data):
+    """Persists a JSON snapshot. Failures are logged, never raised."""
+    try:
+        atomic_write_bytes(cache_path(name), json.dumps(data, indent=2).encode("utf-8"))
+        return True
+    except Exception as e:
+        print(f"Cache snapshot error ({name}): {e}")
+        return False
@@ -0,0 +1,196 @@
+"""
+Headless bulk generation (no Streamlit).
+
+    python -m cli --resume cv.pdf --jobs jobs.jsonl --out output/
+    cat jobs.jsonl | python -m cli --resume cv.pdf --provider Gemini --parallel 4
+
+Jobs are JSONL lines ({"id", "job_description", "date_str"?}) or a folder of .txt files.
+API keys come from the vault (VAULT_PASSWORD for encrypted stores) or OPENAI_API_KEY / GEMINI_API_KEY.
+"""
+import argparse
+import datetime
+import os
+import re
+import sys
+import time
+
+import batch_utils
+import export_utils
+import profile_utils
+import secrets_utils
+import telemetry_utils
+import utils
+
+FORMATS = export_utils.RENDERERS
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Generate cover letters in bulk.")
+    parser.add_argument("--resume", required=True, help="Resume PDF")
+    parser.add_argument("--jobs", default="-", help="JSONL file, folder of .txt files, or '-' for JSONL on stdin")
+    parser.add_argument("--out", default="output", help="Directory for exported letters, or a .zip archive to write them into")
+    parser.add_argument("--provider", choices=["OpenAI", "Gemini"], default="OpenAI")
+    parser.add_argument("--model", default=None, help="Model name (provider default if omitted)")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible server to use instead of api.openai.com (e.g. the local stub_server)")
+    parser.add_argument("--key-name", default=None, help="Name of the vault key to use first (others are failover keys)")
+    parser.add_argument("--profile", default="Default", help="Profile for the letter header")
+    parser.add_argument("--formats", default="docx,pdf,tex", help="Comma-separated subset of: docx,pdf,tex")
+    parser.add_argument("--parallel", type=int, default=batch_utils.BATCH_CONCURRENCY, help="Concurrent generations")
+    parser.add_argument("--retries", type=int, default=1, help="Retries per failed job")
+    parser.add_argument("--date", default=None, help="Letter date (default: today)")
+    parser.add_argument("--fresh", action="store_true", help="Always write a fresh draft (ignore cached drafts)")
+    parser.add_argument("--no-compact", action="store_true", help="Send resume/JD in full (skip boilerplate removal and token budgets)")
+    parser.add_argument("--mode", choices=utils.CHAIN_MODES, default="chain", help="Execution plan for the generation steps")
+    parser.add_argument("--telemetry", default=None, metavar="PATH",
+                        help="Write per-job step timings, tokens and cost to PATH (.csv for CSV, otherwise JSONL)")
+    parser.add_argument("--compare-plans", type=int, metavar="RUNS", default=0,
+                        help="Instead of exporting, time every execution plan on the first job RUNS times and print a latency report")
+    return parser
+
+def load_jobs(source):
+    if source == "-":
+        return batch_utils.parse_jsonl_jobs(sys.stdin, source="stdin")
+    if os.path.isdir(source):
+        return batch_utils.load_jobs_from_folder(source)
+    return batch_utils.load_jobs_from_jsonl(source)
+
+def resolve_api_keys(provider, key_name=None):
+    """
+    Every vault/env key for the provider, as the app lists them. The named key
+    (or the first) leads; the rest are failover keys for throttled/rejected calls.
+    """
+    secrets = secrets_utils.load_secrets(os.getenv("VAULT_PASSWORD"))
+    keys = []
+    for item in secrets["openai_keys" if provider == "OpenAI" else "gemini_keys"]:
+        name, key = (item.get("name"), item.get("key")) if isinstance(item, dict) else (None, item)
+        if not key or key in keys:
+            continue
+        if key_name is not None and name == key_name:
+            keys.insert(0, key)
+            key_name = None
+        else:
+            keys.append(key)
+    if keys and key_name is None:
+        return keys
+    if secrets["requires_unlock"]:
+        raise SystemExit("Vault is locked: set VAULT_PASSWORD or export an API key env var.")
+    raise SystemExit(f"No {provider} API key found" + (f" named '{key_name}'." if key_name else "."))
+
+def safe_filename(job_id):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", job_id).strip("._") or "letter"
+
+def unique_filename(job_id, used):
+    """
+    safe_filename() with a -2, -3... suffix for ids that map to a name already in
+    `used` (compared case-insensitively for macOS/Windows folders); records it.
+    """
+    base = name = safe_filename(job_id)
+    n = 1
+    while name.lower() in used:
+        n += 1
+        name = f"{base}-{n}"
+    used.add(name.lower())
+    return name
+
+def export_data(item, profile):
+    """The exporters' input for one generated letter."""
+    result = item["result"]
+    return {
+        "body": result["text"],
+        "user_info": profile,
+        "date_str": item["date_str"],
+        "hr_info": result.get("hr_info_debug", {}),
+    }
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        raise SystemExit(f"Unknown format(s): {', '.join(unknown)}")
+
+    if args.base_url and args.provider != "OpenAI":
+        raise SystemExit("--base-url needs an OpenAI-compatible provider (--provider OpenAI).")
+    try:
+        api_key = resolve_api_keys(args.provider, args.key_name)
+    except SystemExit:
+        if not args.base_url:
+            raise
+        api_key = "sk-local"  # self-hosted/stub servers usually ignore the key
+    profile = profile_utils.load_profile(args.profile)
+    user_info = profile_utils.user_info_from_profile(profile)
+    date_str = args.date or datetime.date.today().strftime("%B %d, %Y")
+
+    try:
+        jobs = load_jobs(args.jobs)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Could not read jobs: {e}")
+    if not jobs:
+        raise SystemExit("No jobs to run.")
+
+    cv_text = utils.extract_text_from_pdf(args.resume)
+    if not cv_text:
+        raise SystemExit(f"Failed to read resume: {args.resume}")
+
+    if args.compare_plans:
+        print(f"Timing {', '.join(utils.CHAIN_MODES)} on '{jobs[0]['id']}' ({args.compare_plans} run(s) each)", file=sys.stderr)
+        report = utils.compare_plans(cv_text, jobs[0]["job_description"], api_key, args.provider, user_info,
+                                     args.model, runs=args.compare_plans, base_url=args.base_url)
+        print(utils.format_latency_report(report))
+        return 0 if all(row["runs"] for row in report.values()) else 1
+
+    print(f"Generating {len(jobs)} letter(s) with {args.provider} (parallel={args.parallel})", file=sys.stderr)
+    start = time.perf_counter()
+    failures = 0
+    total_tokens = 0
+    records = []
+    waiting = {}  # file name -> job line printed once its exports are written
+    used_names = set()
+
+    def letters():
+        nonlocal failures, total_tokens
+        for item in batch_utils.run_batch(
+            cv_text, jobs, api_key, args.provider, user_info, args.model, date_str,
+            concurrency=args.parallel, retries=args.retries, reuse_draft=not args.fresh,
+            mode=args.mode, compact=not args.no_compact, base_url=args.base_url
+        ):
+            usage = item.get("usage") or {}
+            total_tokens += usage.get("total_tokens", 0)
+            records.append(telemetry_utils.record_from_result(
+                {"ok": item["status"] == "ok", "error": item["error"], "usage": usage}, args.provider, item["id"]))
+            line = (f"{item['id']:<24} {item['status']:<5} {item['elapsed']:>7.2f}s "
+                    f"tokens={usage.get('total_tokens', 0):<6} attempts={item['attempts']}  ")
+            if item["status"] != "ok":
+                failures += 1
+                print(line + item["error"])
+                continue
+            item["date_str"] = item["job"].get("date_str", date_str)
+            name = unique_filename(item["id"], used_names)
+            waiting[name] = line
+            yield name, export_data(item, profile)
+
+    # Exports render on a process pool while the remaining jobs generate
+    export = export_utils.export_letters(letters(), formats, args.out)
+    for done in export:
+        line = waiting.pop(done["name"])
+        if done["error"]:
+            failures += 1
+            print(line + f"export failed: {done['error']}")
+        else:
+            print(line + ", ".join(os.path.basename(p) for p in done["files"]))
+
+    elapsed = time.perf_counter() - start
+    cost = telemetry_utils.summarize_records(records)["cost_est"]
+    print(f"\n{len(jobs) - failures}/{len(jobs)} ok in {elapsed:.1f}s "
+          f"({len(jobs) / elapsed if elapsed else 0:.2f} letters/s), {total_tokens} tokens, ~${cost:.4f}", file=sys.stderr)
+    stats = export.stats
+    print(f"Exported {stats['files']} file(s) for {stats['letters']} letter(s) to {args.out} "
+          f"({stats['letters_per_sec'] or 0:.2f} letters/s export throughput)", file=sys.stderr)
+    if args.telemetry:
+        fmt = "csv" if args.telemetry.endswith(".csv") else "jsonl"
+        with open(args.telemetry, "w", newline="") as f:
+            f.write(telemetry_utils.export_records(records, fmt))
+        print(f"Telemetry for {len(records)} job(s) written to {args.telemetry}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
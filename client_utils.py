@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+from openai import OpenAI, AsyncOpenAI
+import google.generativeai as genai
+import google.ai.generativelanguage as glm
+
+import cache_utils
+
+# Process-wide registry of provider clients so Streamlit sessions sharing a key
+# also share its keep-alive connection pool instead of re-doing TLS per call.
+MAX_CLIENTS = int(os.getenv("LLM_CLIENT_POOL_SIZE", "32"))
+
+_clients = OrderedDict()  # (provider, kind, key fingerprint, base_url) -> client
+_clients_lock = threading.Lock()
+
+def _build_client(provider, kind, api_key, base_url):
+    if provider == "OpenAI":
+        if kind.startswith("async"):
+            # The chain retries through scheduler_utils (backoff, key failover), not the SDK.
+            return AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        return OpenAI(api_key=api_key, base_url=base_url)
+    if provider == "Gemini":
+        # Per-key clients instead of the process-global genai.configure(),
+        # which races when two users with different keys generate at once.
+        client_options = {"api_key": api_key}
+        if base_url:
+            client_options["api_endpoint"] = base_url
+        if kind == "models":
+            return glm.ModelServiceClient(client_options=client_options)
+        if kind.startswith("async"):
+            return glm.GenerativeServiceAsyncClient(client_options=client_options)
+        return glm.GenerativeServiceClient(client_options=client_options)
+    raise ValueError(f"Unknown provider: {provider}")
+
+def get_client(provider, api_key, base_url=None, kind="default"):
+    """
+    Returns a shared client for (provider, key, base_url), creating it on first use.
+    The registry is bounded; the least recently used client is dropped first
+    (in-flight requests keep their reference, the pool is released on GC).
+    """
+    registry_key = (provider, kind, cache_utils.fingerprint(api_key), base_url)
+    with _clients_lock:
+        client = _clients.get(registry_key)
+        if client is not None:
+            _clients.move_to_end(registry_key)
+            return client
+
+    client = _build_client(provider, kind, api_key, base_url)
+    with _clients_lock:
+        # Another thread may have won the race; keep the first one.
+        existing = _clients.get(registry_key)
+        if existing is not None:
+            _clients.move_to_end(registry_key)
+            return existing
+        _clients[registry_key] = client
+        while len(_clients) > MAX_CLIENTS:
+            _clients.popitem(last=False)
+    return client
+
+def _async_kind():
+    """
+    Async clients hold connections bound to the event loop that opened them,
+    so they are pooled per running loop.
+    """
+    return f"async-{id(asyncio.get_running_loop())}"
+
+def get_openai_client(api_key, base_url=None):
+    return get_client("OpenAI", api_key, base_url)
+
+def get_async_openai_client(api_key, base_url=None):
+    """Pooled AsyncOpenAI client; must be called from inside a running event loop."""
+    return get_client("OpenAI", api_key, base_url, kind=_async_kind())
+
+def get_gemini_model(api_key, model_name, asynchronous=False):
+    """A GenerativeModel bound to this key's pooled client (no global configure)."""
+    model = genai.GenerativeModel(model_name)
+    if asynchronous:
+        model._async_client = get_client("Gemini", api_key, kind=_async_kind())
+    else:
+        model._client = get_client("Gemini", api_key)
+    return model
+
+def list_gemini_models(api_key):
+    """genai.list_models() using this key's pooled model-service client."""
+    return genai.list_models(client=get_client("Gemini", api_key, kind="models"))
+
+def clear_clients():
+    with _clients_lock:
+        _clients.clear()
+
+def pool_size():
+    with _clients_lock:
+        return len(_clients)
@@ -0,0 +1,197 @@
+import os
+import re
+
+try:
+    import tiktoken  # optional: exact OpenAI token counts
+except ImportError:
+    tiktoken = None
+
+# Per-section token budgets applied before the chain (0 disables the cap).
+CV_TOKEN_BUDGET = int(os.getenv("CV_TOKEN_BUDGET", "6000"))
+JD_TOKEN_BUDGET = int(os.getenv("JD_TOKEN_BUDGET", "2000"))
+
+# Rough chars-per-token ratio when no tokenizer is available (English prose).
+CHARS_PER_TOKEN = 4
+
+# --- Token Counting ---
+
+_encodings = {}
+
+def _openai_encoding(model_name):
+    key = model_name or "gpt-4o"
+    if key not in _encodings:
+        try:
+            _encodings[key] = tiktoken.encoding_for_model(key)
+        except KeyError:
+            _encodings[key] = tiktoken.get_encoding("o200k_base")
+    return _encodings[key]
+
+def count_tokens(text, provider="OpenAI", model_name=None):
+    """
+    Token count for a provider. OpenAI uses tiktoken when installed; Gemini
+    (and OpenAI without tiktoken) uses a chars/token estimate, which avoids
+    a network round trip per count.
+    """
+    if not text:
+        return 0
+    if provider == "OpenAI" and tiktoken is not None:
+        return len(_openai_encoding(model_name).encode(text))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+# --- Boilerplate Removal ---
+
+# Sentences that never help matching or drafting.
+BOILERPLATE_PATTERNS = [
+    r"equal (employment )?opportunity",
+    r"without regard to (race|age|sex|gender|religion)",
+    r"reasonable accommodations?",
+    r"e-?verify",
+    r"do not accept unsolicited (resumes|agency)",
+]
+
+# Headings that open a benefits section; it runs until the next heading.
+BENEFIT_HEADINGS = r"(benefits|perks( (and|&) benefits)?|what we offer|why (work|join) (with |for )?us|compensation (and|&) benefits)"
+
+_boilerplate_re = re.compile("|".join(BOILERPLATE_PATTERNS), re.IGNORECASE)
+_benefit_heading_re = re.compile(rf"^\W*{BENEFIT_HEADINGS}\W*$", re.IGNORECASE)
+_page_marker_re = re.compile(r"^\s*(page\s*)?\d+\s*(of|/)\s*\d+\s*$|^\s*page\s+\d+\s*$", re.IGNORECASE)
+
+# Headings that end a benefits section even without a trailing ':'.
+SECTION_HEADINGS = r"(about( (the|this))? (role|company|team|us|you)|requirements|qualifications|responsibilities|what you('| wi)ll do|how to apply|skills)"
+_section_heading_re = re.compile(rf"^\W*{SECTION_HEADINGS}\W*$", re.IGNORECASE)
+
+def _is_heading(line):
+    """Short line ending in ':', in upper case, or a known JD section name."""
+    text = line.strip()
+    if not text or len(text) > 60 or text.startswith(("-", "*", "•")):
+        return False
+    return text.endswith(":") or text.isupper() or bool(_section_heading_re.match(text))
+
+def _paragraphs(text):
+    return [p for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+def normalize_whitespace(text):
+    """Collapses runs of spaces/tabs and blank lines; keeps line structure."""
+    text = re.sub(r"[ \t\r\f\v]+", " ", text or "")
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def _split_sentences(line):
+    return re.split(r"(?<=[.!?])\s+", line)
+
+def _running_header_repeats(lines):
+    """
+    Indices of later repeats of the document's first lines that sit at a page
+    boundary: within two lines of a page marker, or next to another repeated
+    header line (a header block). A lone repeat elsewhere is real content.
+    """
+    rows = [i for i, l in enumerate(lines) if l.strip()]
+    head = {lines[i].strip() for i in rows[:3] if len(lines[i].strip()) > 3}
+    seen = set()
+    repeats = []  # positions in `rows`
+    for pos, i in enumerate(rows):
+        stripped = lines[i].strip()
+        if stripped in head:
+            if stripped in seen:
+                repeats.append(pos)
+            seen.add(stripped)
+    markers = {pos for pos, i in enumerate(rows) if _page_marker_re.match(lines[i].strip())}
+    repeat_set = set(repeats)
+    drop = set()
+    for pos in repeats:
+        near_marker = any(p in markers for p in range(pos - 2, pos + 3))
+        in_block = pos - 1 in repeat_set or pos + 1 in repeat_set
+        if near_marker or in_block:
+            drop.add(rows[pos])
+    return drop
+
+def remove_boilerplate(text, legal=True):
+    """
+    Drops EEO/legal sentences (unless legal=False), benefits sections, page markers, and running
+    headers (repeats of the document's first lines at page boundaries, as PDF
+    extraction produces for multi-page resumes). Legal text is matched per
+    sentence, since extracted or pasted text often has no blank lines.
+    Exact duplicate paragraphs are kept once.
+    """
+    lines = text.split("\n")
+    headers = _running_header_repeats(lines)
+    kept = []
+    in_benefits = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if _benefit_heading_re.match(stripped):
+            in_benefits = True
+            continue
+        if in_benefits:
+            if _is_heading(stripped):
+                in_benefits = False
+            else:
+                continue
+        if _page_marker_re.match(stripped) or i in headers:
+            continue
+        if legal and _boilerplate_re.search(stripped) and not _is_heading(stripped):
+            sentences = [s for s in _split_sentences(stripped) if not _boilerplate_re.search(s)]
+            if not sentences:
+                continue
+            line = " ".join(sentences)
+        kept.append(line)
+
+    paragraphs = []
+    seen = set()
+    for para in _paragraphs("\n".join(kept)):
+        key = re.sub(r"\s+", " ", para).strip().lower()
+        if len(key) >= 40 and key in seen:
+            continue
+        seen.add(key)
+        paragraphs.append(para)
+    return "\n\n".join(paragraphs)
+
+# --- Budgets ---
+
+def truncate_to_budget(text, budget, provider="OpenAI", model_name=None):
+    """
+    Keeps whole lines from the top until `budget` tokens are used. The top of a
+    CV/JD carries the most signal (summary, latest role, requirements).
+    """
+    if not budget or count_tokens(text, provider, model_name) <= budget:
+        return text
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = count_tokens(line + "\n", provider, model_name)
+        if used + cost > budget:
+            if not kept:
+                # A single oversized line: cut it by characters.
+                kept.append(line[:budget * CHARS_PER_TOKEN])
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept).rstrip()
+
+def compact_section(text, budget, provider="OpenAI", model_name=None, legal=True):
+    """Returns (compacted_text, {"before", "after", "budget"}) in tokens."""
+    before = count_tokens(text, provider, model_name)
+    compacted = normalize_whitespace(remove_boilerplate(normalize_whitespace(text), legal))
+    compacted = truncate_to_budget(compacted, budget, provider, model_name)
+    return compacted, {"before": before, "after": count_tokens(compacted, provider, model_name), "budget": budget}
+
+def compact_inputs(cv_text, job_description, provider="OpenAI", model_name=None, cv_budget=None, jd_budget=None):
+    """
+    Compacts the resume and JD before they enter the prompts.
+    Returns (cv_text, job_description, report) where report is recorded in
+    usage["compaction"]: per-section token counts/budgets and total tokens saved.
+    The JD figure counts once, although the chain sends it to more than one step.
+    """
+    cv_budget = CV_TOKEN_BUDGET if cv_budget is None else cv_budget
+    jd_budget = JD_TOKEN_BUDGET if jd_budget is None else jd_budget
+    # EEO wording in a resume describes the applicant's work, not boilerplate
+    cv_out, cv_report = compact_section(cv_text, cv_budget, provider, model_name, legal=False)
+    jd_out, jd_report = compact_section(job_description, jd_budget, provider, model_name)
+    saved = (cv_report["before"] - cv_report["after"]) + (jd_report["before"] - jd_report["after"])
+    report = {
+        "cv": cv_report,
+        "jd": jd_report,
+        "saved_tokens": saved,
+        "counter": "tiktoken" if provider == "OpenAI" and tiktoken is not None else "estimate",
+    }
+    return cv_out, jd_out, report
@@ -1,35 +1,123 @@
+import atexit
+import collections
+import concurrent.futures
+import copy
 import io
+import json
 import os
-import re
+import threading
+import time
+import zipfile
 from docx import Document
+from docx.document import Document as DocxDocument
+from docx.opc.oxml import serialize_part_xml
 from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from fpdf import FPDF
+from fontTools import ttLib, subset as ftsubset
 
-# --- Helper: Markdown Parsing (Basic) ---
-def parse_markdown_to_segments(text):
+import cache_utils
+
+# --- Markdown Segments ---
+
+# Run styles (bit mask) and segment kinds shared by the three exporters.
+BOLD, ITALIC = 1, 2
+SEG_LINE, SEG_BULLET, SEG_BREAK = "line", "bullet", "break"
+BULLET_MARKERS = ("- ", "* ")
+
+# Body hash -> segments; the exporters of one letter parse it once.
+_segment_cache = cache_utils.LRUCache(maxsize=32)
+
+def _parse_inline(line):
     """
-    Splits text into segments of (text, is_bold, is_italic).
-    Very basic, non-nesting support for **bold** and *italic*.
-    Returns list of dicts.
+    [(text, style)] runs of one line in a single scan. "**" toggles BOLD and
+    "*" ITALIC; a marker only opens before and closes after a non-space
+    character, and one left open at the end of the line is kept as text.
     """
-    # Placeholder for a real parser. 
-    # For now, we'll return raw text to avoid breaking simple paragraphs
-    # or implement a simple splitter if needed.
-    # Given the complexity, we'll stick to paragraph splitting and basic cleaning for now
-    # unless we do regex split.
-    pass
+    runs, buf, opened = [], [], {}  # opened: flag -> (run index, marker, style before)
+    style, i, n = 0, 0, len(line)
+    while i < n:
+        if line[i] != "*":
+            j = line.find("*", i)
+            j = n if j == -1 else j
+            buf.append(line[i:j])
+            i = j
+            continue
+        marker = "**" if line.startswith("**", i) else "*"
+        flag = BOLD if marker == "**" else ITALIC
+        end = i + len(marker)
+        if style & flag and i > 0 and not line[i - 1].isspace():
+            runs.append(("".join(buf), style))
+            buf, style = [], style & ~flag
+            del opened[flag]
+        elif not style & flag and end < n and not line[end].isspace():
+            runs.append(("".join(buf), style))
+            opened[flag] = (len(runs), marker, style)
+            buf, style = [], style | flag
+        else:
+            buf.append(marker)
+        i = end
+    runs.append(("".join(buf), style))
 
-# --- DOCX Export ---
-def create_docx(data):
+    # Unclosed markers: back to literal text, style dropped from the runs after them
+    for flag, (index, marker, before) in sorted(opened.items(), key=lambda item: -item[1][0]):
+        runs[index:] = [(marker, before)] + [(t, s & ~flag) for t, s in runs[index:]]
+
+    merged = []
+    for text, run_style in runs:
+        if not text:
+            continue
+        if merged and merged[-1][1] == run_style:
+            merged[-1] = (merged[-1][0] + text, run_style)
+        else:
+            merged.append((text, run_style))
+    return tuple(merged)
+
+def parse_markdown_to_segments(text):
     """
-    Creates a Word document with professional styling.
+    Tokenizes a letter body in one pass into a tuple of (kind, runs):
+    SEG_LINE or SEG_BULLET for each non-empty line ("- " / "* " markers removed)
+    and SEG_BREAK (runs None) for blank lines between them. runs is a tuple of
+    (text, style) with style a BOLD | ITALIC mask. Memoized per body.
     """
-    text = data.get('body', '')
-    user_info = data.get('user_info', {})
-    
+    key = cache_utils.hash_text(text or "")
+    segments = _segment_cache.get(key)
+    if segments is not None:
+        return segments
+
+    segments = []
+    for line in (text or "").split("\n"):
+        clean_line = line.strip()
+        if not clean_line:
+            if segments and segments[-1][0] != SEG_BREAK:
+                segments.append((SEG_BREAK, None))
+            continue
+        if clean_line.startswith(BULLET_MARKERS):
+            segments.append((SEG_BULLET, _parse_inline(clean_line[2:].lstrip())))
+        else:
+            segments.append((SEG_LINE, _parse_inline(clean_line)))
+    if segments and segments[-1][0] == SEG_BREAK:
+        segments.pop()
+    segments = tuple(segments)
+    _segment_cache.set(key, segments)
+    return segments
+
+# --- DOCX Export ---
+
+DOCX_TEMPLATE_CACHE_SIZE = int(os.getenv("DOCX_TEMPLATE_CACHE_SIZE", "16"))
+DOCX_DOCUMENT_PART = "word/document.xml"
+
+# Header fields hash -> pre-built template (see docx_template). Shared by every session.
+_docx_templates = cache_utils.LRUCache(maxsize=DOCX_TEMPLATE_CACHE_SIZE)
+
+def _header_key(user_info):
+    fields = [user_info.get(k) for k in ("full_name", "address", "email", "phone", "linkedin")]
+    return cache_utils.hash_text(json.dumps(fields, default=str))
+
+def _build_docx_template(user_info):
+    """A Document holding only the styled header: name, contact line and rule."""
     doc = Document()
-    
+
     # 1. Header
     name_paragraph = doc.add_paragraph()
     name_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -51,6 +139,44 @@ def create_docx(data):
     contact_paragraph.paragraph_format.space_after = Pt(12)
     
     doc.add_paragraph("__________________________________________________________________________")
+    return doc
+
+def docx_template(user_info):
+    """
+    The header template for a profile, built once and cached:
+    "bytes" is the complete header-only .docx, "package" the same archive
+    without word/document.xml (the only part that changes per letter) and
+    "doc" the parsed Document whose body element is cloned per render.
+    """
+    key = _header_key(user_info)
+    template = _docx_templates.get(key)
+    if template is not None:
+        return template
+
+    doc = _build_docx_template(user_info)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    package = io.BytesIO()
+    with zipfile.ZipFile(buffer) as src, zipfile.ZipFile(package, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            if info.filename != DOCX_DOCUMENT_PART:
+                dst.writestr(info, src.read(info))
+    template = {"bytes": buffer.getvalue(), "package": package.getvalue(), "doc": doc}
+    _docx_templates.set(key, template)
+    return template
+
+def create_docx(data):
+    """
+    Creates a Word document with professional styling.
+    The header comes from the cached profile template; only the body
+    paragraphs are written here.
+    """
+    text = data.get('body', '')
+    user_info = data.get('user_info', {})
+    
+    template = docx_template(user_info)
+    # The clone shares the template's (read-only) part for style lookups
+    doc = DocxDocument(copy.deepcopy(template["doc"].element), template["doc"].part)
     
     # 2. Date & Recipient (Basic formatting)
     # We expect the body to contain the "Dear ..." and the date/address block usually? 
@@ -73,29 +199,101 @@ def create_docx(data):
     # If the text has the header, we'll see duplicates if we add one.
     # Let's assume the user wants the AI generated text as-is but with Markdown->Formatting.
     
-    last_p = None
-    for line in text.split('\n'):
-        # Basic list bullet handling
-        clean_line = line.strip()
-        if clean_line.startswith("- ") or clean_line.startswith("* "):
-            p = doc.add_paragraph(clean_line[2:], style='List Bullet')
-        else:
-            if clean_line:
-                # Handle bolding logic: **text**
-                p = doc.add_paragraph()
-                parts = re.split(r'(\*\*.*?\*\*)', clean_line)
-                for part in parts:
-                    if part.startswith("**") and part.endswith("**"):
-                        r = p.add_run(part[2:-2])
-                        r.bold = True
-                    else:
-                        p.add_run(part)
+    for kind, runs in parse_markdown_to_segments(text):
+        if kind == SEG_BREAK:
+            continue  # Paragraph spacing already separates the lines
+        p = doc.add_paragraph(style='List Bullet' if kind == SEG_BULLET else None)
+        for run_text, style in runs:
+            r = p.add_run(run_text)
+            if style & BOLD:
+                r.bold = True
+            if style & ITALIC:
+                r.italic = True
     
-    buffer = io.BytesIO()
-    doc.save(buffer)
+    # Append the new document part to a copy of the template archive
+    buffer = io.BytesIO(template["package"])
+    with zipfile.ZipFile(buffer, "a", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(DOCX_DOCUMENT_PART, serialize_part_xml(doc.element))
     buffer.seek(0)
     return buffer
 
+# --- PDF Font Cache ---
+
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", os.path.join("assets", "fonts", "DejaVuSans.ttf"))
+# Embed from a pre-subset copy of the font covering the scripts letters use.
+# Parsing and subsetting the full DejaVu file dominated a one-page render.
+PDF_FONT_CACHE = os.getenv("PDF_FONT_CACHE", "1") == "1"
+# Latin, punctuation, currency, letterlike symbols, arrows, shapes (bullets).
+CORE_UNICODE_RANGES = [(0x20, 0x24F), (0x2000, 0x206F), (0x20A0, 0x20BF), (0x2100, 0x214F),
+                       (0x2190, 0x21FF), (0x25A0, 0x25FF)]
+
+_font_assets = {}  # (font path, mtime, size) -> {"path", "chars"}
+_font_lock = threading.Lock()
+
+def _build_core_font(font_path, key):
+    """Writes (once per font file, under CACHE_DIR) the core-range subset of a font."""
+    name = os.path.splitext(os.path.basename(font_path))[0]
+    digest = cache_utils.hash_text(repr((key, CORE_UNICODE_RANGES)))[:16]
+    core_path = cache_utils.cache_path("fonts", f"{name}-core-{digest}.ttf")
+    if not os.path.exists(core_path):
+        font = ttLib.TTFont(font_path)
+        options = ftsubset.Options(notdef_outline=True, recommended_glyphs=True, name_IDs=["*"])
+        options.drop_tables += ["FFTM"]
+        subsetter = ftsubset.Subsetter(options)
+        subsetter.populate(unicodes=[c for lo, hi in CORE_UNICODE_RANGES for c in range(lo, hi + 1)])
+        subsetter.subset(font)
+        out = io.BytesIO()
+        font.save(out)
+        cache_utils.atomic_write_bytes(core_path, out.getvalue())
+    chars = frozenset(ttLib.TTFont(core_path, lazy=True).getBestCmap())
+    return {"path": core_path, "chars": chars}
+
+def core_font(font_path=None):
+    """
+    Process-wide asset for the PDF font: the path of its pre-subset copy and the
+    code points it covers. Built on first use (or preload_pdf_assets()) and
+    shared by every render and thread; None if the font is missing or unusable.
+    """
+    font_path = font_path or PDF_FONT_PATH
+    try:
+        stat = os.stat(font_path)
+    except OSError:
+        return None
+    key = (os.path.abspath(font_path), stat.st_mtime_ns, stat.st_size)
+    with _font_lock:
+        if key not in _font_assets:
+            try:
+                _font_assets[key] = _build_core_font(font_path, key)
+            except Exception as e:
+                print(f"Font cache error: {e}")
+                _font_assets[key] = None
+        return _font_assets[key]
+
+def preload_pdf_assets():
+    """Builds the font asset ahead of the first export (e.g. at app startup)."""
+    return core_font() if PDF_FONT_CACHE else None
+
+def _pdf_font_file(text, font_path=None):
+    """The cached core font when it covers `text`, else the full font file."""
+    font_path = font_path or PDF_FONT_PATH
+    if PDF_FONT_CACHE:
+        asset = core_font(font_path)
+        if asset and all(ord(c) in asset["chars"] for c in set(text) if c >= " "):
+            return asset["path"]
+    return font_path
+
+# fpdf style -> file name suffix of the matching sibling of PDF_FONT_PATH
+PDF_STYLE_SUFFIXES = {"B": "-Bold", "I": "-Oblique", "BI": "-BoldOblique"}
+
+def _pdf_style(style):
+    return ("B" if style & BOLD else "") + ("I" if style & ITALIC else "")
+
+def _pdf_style_font(pdf_style):
+    """DejaVuSans-Bold.ttf etc. next to PDF_FONT_PATH, or None if not shipped."""
+    root, ext = os.path.splitext(PDF_FONT_PATH)
+    path = root + PDF_STYLE_SUFFIXES[pdf_style] + ext
+    return path if os.path.exists(path) else None
+
 # --- PDF Export ---
 def create_pdf(data):
     """
@@ -108,40 +306,64 @@ def create_pdf(data):
     pdf.set_margins(25, 25, 25) # 25mm margins
     pdf.add_page()
     
+    segments = parse_markdown_to_segments(text)
+    used_styles = {_pdf_style(style) for _, runs in segments if runs for _, style in runs} - {""}
+
     # Font Handling
-    # Check for DejaVuSans
-    font_path = os.path.join("assets", "fonts", "DejaVuSans.ttf")
+    # Check for DejaVuSans (the cached core subset when it covers the letter)
+    font_path = PDF_FONT_PATH
     font_loaded = False
     
     if os.path.exists(font_path):
         try:
-            pdf.add_font("DejaVu", fname=font_path, uni=True)
-            pdf.set_font("DejaVu", size=11)
+            pdf.add_font("DejaVu", fname=_pdf_font_file(text))
+            family, styles = "DejaVu", set()
+            # Bold / italic runs need their own font file; without one they print regular
+            for pdf_style in used_styles:
+                style_path = _pdf_style_font(pdf_style)
+                if style_path:
+                    pdf.add_font("DejaVu", style=pdf_style, fname=_pdf_font_file(text, style_path))
+                    styles.add(pdf_style)
             font_loaded = True
         except Exception as e:
             print(f"Font loading error: {e}")
     
     if not font_loaded:
         # Fallback to standard font (Latin-1 limitations)
-        pdf.set_font("Helvetica", size=11)
+        family, styles = "Helvetica", set(PDF_STYLE_SUFFIXES)
         # Attempt to clean unicode if using standard
         # We'll just replace commonly problematic chars
         replacements = {
             '\u2018': "'", '\u2019': "'", '\u201c': '"', '\u201d': '"', 
             '\u2013': '-', '\u2014': '--', '\u2022': '*'
         }
+
+    def clean(s):
+        if font_loaded:
+            return s
         for k,v in replacements.items():
-            text = text.replace(k, v)
+            s = s.replace(k, v)
         # Force encode
-        text = text.encode('latin-1', 'replace').decode('latin-1')
+        return s.encode('latin-1', 'replace').decode('latin-1')
 
-    # Content
-    # Handle bolding **text** specifically? 
-    # FPDF with uni=True supports some styled writing but multi_cell is tricky.
-    # We will do simple write for now, or use write_html logic if we had HTML.
-    # We'll stick to plain text dump with paragraphs for robustness.
-    
-    pdf.multi_cell(0, 6, text)
+    # Content: one write() per styled run, one line per segment
+    line_height = 6
+    left_margin = pdf.l_margin
+    pdf.set_font(family, size=11)
+    for kind, runs in segments:
+        if kind == SEG_BREAK:
+            pdf.ln(line_height)
+            continue
+        if kind == SEG_BULLET:
+            pdf.set_font(family, size=11)
+            pdf.write(line_height, clean("\u2022 "))
+            pdf.set_left_margin(pdf.get_x())  # wrapped lines align with the item text
+        for run_text, style in runs:
+            pdf_style = _pdf_style(style)
+            pdf.set_font(family, style=pdf_style if pdf_style in styles else "", size=11)
+            pdf.write(line_height, clean(run_text))
+        pdf.ln(line_height)
+        pdf.set_left_margin(left_margin)
     
     buffer = io.BytesIO()
     pdf_bytes = pdf.output()
@@ -177,24 +399,32 @@ def create_latex(data):
         }
         return "".join(chars.get(c, c) for c in s)
 
-    # Basic Paragraphs
-    # Replace double newlines with \par
-    # We must escape the content first!
-    safe_text = latex_escape(text)
-    
-    # Restore bolding? **text** -> \textbf{text}
-    # Regex replace: \\*\\*(.*?)\\*\\* -> \textbf{$1}
-    # Note: we escaped * to * (it's not special in latex usually, unless active). 
-    # Actually * is fine.
-    safe_text = re.sub(r'\*\*(.*?)\*\*', r'\\textbf{\1}', safe_text)
-    safe_text = re.sub(r'\*(.*?)\*', r'\\textit{\1}', safe_text)
-    
-    # Handle newlines
-    # If we just put newlines, LaTeX treats single newline as space, double as paragraph.
-    # We'll preserve structure.
-    safe_text = safe_text.replace('\n', '\n\n') # Force paragraphs for every line? Too much.
-    # Actually, input text usually has blank lines for paragraphs.
-    # We'll just let LaTeX handle blank lines naturally.
+    def latex_runs(runs):
+        out = []
+        for run_text, style in runs:
+            run_text = latex_escape(run_text)
+            if style & ITALIC:
+                run_text = r'\textit{%s}' % run_text
+            if style & BOLD:
+                run_text = r'\textbf{%s}' % run_text
+            out.append(run_text)
+        return "".join(out)
+
+    # Every line is its own paragraph (blank lines add nothing under parskip);
+    # consecutive bullets become one itemize list.
+    blocks, items = [], []
+    for kind, runs in parse_markdown_to_segments(text):
+        if kind == SEG_BULLET:
+            items.append(r'  \item ' + latex_runs(runs))
+            continue
+        if items:
+            blocks.append("\\begin{itemize}\n%s\n\\end{itemize}" % "\n".join(items))
+            items = []
+        if kind == SEG_LINE:
+            blocks.append(latex_runs(runs))
+    if items:
+        blocks.append("\\begin{itemize}\n%s\n\\end{itemize}" % "\n".join(items))
+    safe_text = "\n\n".join(blocks)
     
     template = r"""
 \documentclass[11pt,a4paper]{article}
@@ -219,3 +449,269 @@ def create_latex(data):
     buffer.write(latex_code.encode('utf-8'))
     buffer.seek(0)
     return buffer, latex_code
+
+# --- Export Manager ---
+
+# Format id -> renderer returning the file bytes.
+RENDERERS = {
+    "docx": lambda data: create_docx(data).getvalue(),
+    "pdf": lambda data: create_pdf(data).getvalue(),
+    "tex": lambda data: create_latex(data)[0].getvalue(),
+}
+
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE", "64"))
+
+# (body hash, user_info hash, format) -> bytes. Shared by every session.
+_render_cache = cache_utils.LRUCache(maxsize=EXPORT_CACHE_SIZE)
+_pending = {}  # same key -> Future of a render in progress
+_pending_lock = threading.Lock()
+_export_pool = None
+
+def content_key(data):
+    """
+    (body hash, user_info hash) for a letter. The user_info hash also covers
+    the date and HR fields so every input of the exporters is keyed.
+    """
+    profile = json.dumps({"user_info": data.get("user_info", {}), "date_str": data.get("date_str"),
+                          "hr_info": data.get("hr_info", {})}, sort_keys=True, default=str)
+    return cache_utils.hash_text(data.get("body", "")), cache_utils.hash_text(profile)
+
+def render_export(data, fmt):
+    """
+    Bytes of one format, memoized by (body hash, user_info hash, format).
+    Concurrent requests for the same key wait for a single render.
+    """
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    key = content_key(data) + (fmt,)
+    with _pending_lock:
+        cached = _render_cache.get(key)
+        if cached is not None:
+            return cached
+        future = _pending.get(key)
+        owner = future is None
+        if owner:
+            future = _pending[key] = concurrent.futures.Future()
+    if not owner:
+        return future.result()
+    try:
+        result = RENDERERS[fmt](data)
+        _render_cache.set(key, result)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _pending_lock:
+            _pending.pop(key, None)
+
+def clear_caches():
+    """Drops rendered exports, profile templates, parsed bodies and font assets (factory reset)."""
+    with _pending_lock:
+        _render_cache.clear()
+    _docx_templates.clear()
+    _segment_cache.clear()
+    with _font_lock:
+        _font_assets.clear()
+
+def _get_export_pool():
+    global _export_pool
+    with _pending_lock:
+        if _export_pool is None:
+            # One worker: the renderers are CPU-bound and hold the GIL anyway.
+            _export_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        return _export_pool
+
+class ExportManager:
+    """
+    Exports of the letter being edited. update() only records the content hash;
+    a format is rendered when get() asks for it or when the background worker
+    reaches it. Worker jobs for content that has since been edited are skipped.
+    """
+
+    def __init__(self):
+        self.data = None
+        self.key = None
+
+    def update(self, data, prefetch=()):
+        """Records the current letter and queues background renders for `prefetch` formats."""
+        self.data = dict(data)
+        self.key = content_key(self.data)
+        for fmt in prefetch:
+            _get_export_pool().submit(self._prefetch, self.key, self.data, fmt)
+        return self.key
+
+    def _prefetch(self, key, data, fmt):
+        if key != self.key:
+            return
+        try:
+            render_export(data, fmt)
+        except Exception as e:
+            print(f"Export error ({fmt}): {e}")
+
+    def ready(self, fmt):
+        """True if `fmt` is rendered for the current content (get() won't block)."""
+        return self.key is not None and (self.key + (fmt,)) in _render_cache
+
+    def get(self, fmt):
+        """Bytes of `fmt` for the current content, rendering it now if needed."""
+        if self.data is None:
+            return None
+        return render_export(self.data, fmt)
+
+# --- Bulk Export ---
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Letters rendered or waiting to be written at once; bounds memory on long streams.
+EXPORT_WINDOW = int(os.getenv("EXPORT_WINDOW", str(EXPORT_WORKERS * 2)))
+# Already-compressed formats are stored as-is in archives.
+STORED_FORMATS = {"docx", "pdf"}
+
+_bulk_pool = None
+
+def _render_letter(data, formats):
+    """
+    Worker: every format of one letter, {fmt: bytes}, or an error string.
+    Top-level so it can run in a process pool; each worker process keeps its
+    own DOCX template and font caches across letters.
+    """
+    try:
+        return {fmt: RENDERERS[fmt](data) for fmt in formats}, None
+    except Exception as e:
+        return {}, str(e)
+
+def _get_bulk_pool():
+    global _bulk_pool
+    with _pending_lock:
+        if _bulk_pool is None:
+            # Processes, not threads: python-docx and fpdf2 are CPU-bound and hold the GIL.
+            _bulk_pool = concurrent.futures.ProcessPoolExecutor(max_workers=EXPORT_WORKERS)
+            atexit.register(_bulk_pool.shutdown, cancel_futures=True)
+        return _bulk_pool
+
+class _ExportSink:
+    """Writes rendered files into a directory, or into a .zip archive as they arrive."""
+
+    def __init__(self, out):
+        self.out = out
+        self.archive = None
+        self.used = set()  # lower-cased names already written in this export
+        if out.lower().endswith(".zip"):
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+            self.archive = zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED)
+        else:
+            os.makedirs(out, exist_ok=True)
+
+    def reserve(self, name):
+        """
+        `name`, or name-2, name-3... if a letter was already written under it:
+        no overwritten files or duplicate archive entries.
+        """
+        unique, n = name, 1
+        while unique.lower() in self.used:
+            n += 1
+            unique = f"{name}-{n}"
+        self.used.add(unique.lower())
+        return unique
+
+    def write(self, name, fmt, content):
+        filename = f"{name}.{fmt}"
+        if self.archive is not None:
+            compress = zipfile.ZIP_STORED if fmt in STORED_FORMATS else zipfile.ZIP_DEFLATED
+            self.archive.writestr(filename, content, compress_type=compress)
+            return filename
+        path = os.path.join(self.out, filename)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+class BulkExport:
+    """
+    Iterator over a bulk export, one {"name", "files", "bytes", "error"} per
+    letter in input order (a repeated name is written as name-2, name-3...). Once exhausted, .stats holds {"letters", "failed",
+    "files", "bytes", "elapsed", "input_wait", "letters_per_sec"}, where the
+    rate leaves out time spent waiting for the next letter from the input.
+    """
+
+    def __init__(self, letters, formats, out, parallel=True, window=None):
+        unknown = [fmt for fmt in formats if fmt not in RENDERERS]
+        if unknown:
+            raise ValueError(f"Unknown export format(s): {', '.join(unknown)}")
+        self.letters = letters
+        self.formats = list(formats)
+        self.out = out
+        self.parallel = parallel and EXPORT_WORKERS > 1
+        self.window = max(1, window or EXPORT_WINDOW)
+        self.stats = None
+
+    def _write(self, sink, name, rendered):
+        files, error = rendered
+        paths = []
+        if not error:
+            unique = sink.reserve(name)
+            paths = [sink.write(unique, fmt, files[fmt]) for fmt in self.formats]
+        return {"name": name, "files": paths, "bytes": sum(len(c) for c in files.values()), "error": error}
+
+    def __iter__(self):
+        start = time.perf_counter()
+        stats = {"letters": 0, "failed": 0, "files": 0, "bytes": 0}
+        pending = collections.deque()  # (name, future), oldest first
+        sink = _ExportSink(self.out)
+
+        def finish(name, rendered):
+            item = self._write(sink, name, rendered)
+            stats["letters"] += 1
+            stats["failed"] += bool(item["error"])
+            stats["files"] += len(item["files"])
+            stats["bytes"] += item["bytes"]
+            return item
+
+        def collect():
+            name, future = pending.popleft()
+            return finish(name, future.result())
+
+        letters = iter(self.letters)
+        input_wait = 0.0
+        try:
+            while True:
+                # Time blocked on the producer (e.g. generation) doesn't count against throughput
+                waited = time.perf_counter()
+                try:
+                    name, data = next(letters)
+                except StopIteration:
+                    break
+                finally:
+                    input_wait += time.perf_counter() - waited
+                if not self.parallel:
+                    yield finish(name, _render_letter(data, self.formats))
+                    continue
+                pending.append((name, _get_bulk_pool().submit(_render_letter, data, self.formats)))
+                # Write what is done; block only when the window is full
+                while pending and (len(pending) >= self.window or pending[0][1].done()):
+                    yield collect()
+            while pending:
+                yield collect()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            sink.close()
+            elapsed = time.perf_counter() - start
+            busy = elapsed - input_wait
+            stats["elapsed"] = round(elapsed, 3)
+            stats["input_wait"] = round(input_wait, 3)
+            stats["letters_per_sec"] = round(stats["letters"] / busy, 2) if busy > 0 else None
+            self.stats = stats
+
+def export_letters(letters, formats, out, parallel=True, window=None):
+    """
+    Renders a stream of (name, data) letters in every format on a process pool
+    (EXPORT_WORKERS) and writes them to the `out` directory as name.fmt, or into
+    `out` itself when it ends in .zip. At most `window` letters are in flight,
+    so memory stays flat however long the stream is. Returns a BulkExport.
+    """
+    return BulkExport(letters, formats, out, parallel, window)
@@ -62,3 +62,13 @@ def save_profile(profile_name, data):
     except Exception as e:
         print(f"Error saving profile: {e}")
         return False
+
+def user_info_from_profile(profile):
+    """Maps a saved profile to the user_info dict the generation prompts expect."""
+    return {
+        "name": profile.get("full_name", ""),
+        "email": profile.get("email", ""),
+        "phone": profile.get("phone", ""),
+        "linkedin": profile.get("linkedin", ""),
+        "address": profile.get("address", "")
+    }
@@ -0,0 +1,134 @@
+import math
+import os
+import re
+from collections import Counter
+
+import cache_utils
+
+# Step 2 receives the top-k CV chunks instead of the whole CV (0 disables).
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+# Target chunk size in words; chunks break on line boundaries.
+CHUNK_WORDS = 60
+
+# BM25 parameters (standard defaults).
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "of", "on", "or", "our", "the", "to", "we", "with", "you", "your", "will", "using", "etc",
+}
+
+# --- Tokenizing / Chunking ---
+
+def tokenize(text):
+    """Lower-cased terms; keeps tech tokens such as 'c++', 'c#', 'node.js'."""
+    terms = re.findall(r"[a-z0-9][a-z0-9+#.]*", (text or "").lower())
+    return [t.rstrip(".") for t in terms if t.rstrip(".") not in STOPWORDS]
+
+def chunk_text(text, max_words=CHUNK_WORDS):
+    """Groups consecutive lines into chunks of about max_words words."""
+    chunks = []
+    current = []
+    words = 0
+    for line in (text or "").split("\n"):
+        if not line.strip():
+            continue
+        n = len(line.split())
+        if current and words + n > max_words:
+            chunks.append("\n".join(current))
+            current, words = [], 0
+        current.append(line.strip())
+        words += n
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def parse_skills(skills):
+    """'Python, AWS; team leadership' -> ['Python', 'AWS', 'team leadership']."""
+    if isinstance(skills, (list, tuple)):
+        skills = ", ".join(str(s) for s in skills)
+    return [s.strip() for s in re.split(r"[,;\n]|\s+and\s+", skills or "") if tokenize(s)]
+
+# --- Index ---
+
+class CVIndex:
+    """BM25 index over the chunks of one CV."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.docs = [Counter(tokenize(c)) for c in chunks]
+        self.lengths = [sum(d.values()) for d in self.docs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        df = Counter(term for d in self.docs for term in d)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def scores(self, query_terms):
+        """BM25 score of every chunk for the query terms (repeats count once)."""
+        terms = set(query_terms)
+        results = []
+        for doc, length in zip(self.docs, self.lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self.avg_length or 1))
+            for term in terms:
+                tf = doc.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+    def top_k(self, query_terms, k):
+        """Indices of the k best chunks (ties broken by position), in CV order."""
+        scores = self.scores(query_terms)
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+        return sorted(i for i in ranked[:k] if scores[i] > 0)
+
+# cv hash -> CVIndex; one resume is usually matched against many JDs.
+_index_cache = cache_utils.LRUCache(maxsize=32)
+
+def get_index(cv_text):
+    key = cache_utils.hash_text(cv_text)
+    index = _index_cache.get(key)
+    if index is None:
+        index = CVIndex(chunk_text(cv_text))
+        _index_cache.set(key, index)
+    return index
+
+# --- Retrieval ---
+
+def select_passages(cv_text, query, top_k=None):
+    """
+    Returns (text, info): the CV chunks most relevant to `query` (the Step 1
+    skills, or the raw JD), joined in CV order. Short CVs, or queries that match
+    nothing, are returned whole. info = {"chunks", "selected", "top_k"}.
+    """
+    top_k = RETRIEVAL_TOP_K if top_k is None else top_k
+    index = get_index(cv_text)
+    info = {"chunks": len(index.chunks), "selected": len(index.chunks), "top_k": top_k}
+    if not top_k or len(index.chunks) <= top_k:
+        return cv_text, info
+    if isinstance(query, (list, tuple)):
+        # Step 1 may return the skills as a JSON array
+        query = ", ".join(parse_skills(query))
+    elif not isinstance(query, str):
+        query = str(query or "")
+    picked = index.top_k(tokenize(query), top_k)
+    if not picked:
+        return cv_text, info
+    info["selected"] = len(picked)
+    return "\n...\n".join(index.chunks[i] for i in picked), info
+
+def match_report(cv_text, skills):
+    """
+    Deterministic skills coverage, no LLM call: a skill counts as matched when
+    all of its terms appear in one CV chunk. score is the matched percentage.
+    """
+    index = get_index(cv_text)
+    matched, missing = [], []
+    for skill in parse_skills(skills):
+        terms = set(tokenize(skill))
+        found = any(terms.issubset(doc) for doc in index.docs)
+        (matched if found else missing).append(skill)
+    total = len(matched) + len(missing)
+    return {"score": round(100 * len(matched) / total) if total else None, "matched": matched, "missing": missing}
@@ -0,0 +1,167 @@
+import asyncio
+import email.utils
+import os
+import random
+import time
+
+import openai
+
+import cache_utils
+
+# Attempts after the first for one provider call (per key).
+CALL_RETRIES = int(os.getenv("LLM_CALL_RETRIES", "3"))
+# Exponential backoff with full jitter: uniform(0, min(MAX, BASE * 2**n)) seconds.
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+
+# Per-key call budgets (requests/minute). batch_utils.PROVIDER_RATE_LIMITS caps
+# whole generations; these cap the individual calls each key makes.
+KEY_RATE_LIMITS = {
+    "OpenAI": float(os.getenv("OPENAI_KEY_RPM", "500")),
+    "Gemini": float(os.getenv("GEMINI_KEY_RPM", "60")),
+}
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+FAILOVER_STATUSES = {401, 403}
+
+# --- Rate Limiting ---
+
+class RateLimiter:
+    """
+    Async token bucket: `rate` acquisitions per minute, bursts up to `burst`.
+    Batches keep one per provider; the call scheduler keeps one per API key.
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, rate_per_minute / 10.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+_key_limiters = {}
+
+def get_key_limiter(provider, api_key, base_url=None):
+    """Token bucket for one API key (and server); asyncio primitives are per loop."""
+    key = (provider, base_url, cache_utils.fingerprint(api_key), id(asyncio.get_running_loop()))
+    if key not in _key_limiters:
+        _key_limiters[key] = RateLimiter(KEY_RATE_LIMITS.get(provider, 60))
+    return _key_limiters[key]
+
+# --- Error Classification ---
+
+def error_status(error):
+    """HTTP status of a provider error (OpenAI status_code, google.api_core code), or None."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+def classify_error(error):
+    """
+    "retry" for transient failures (429, 5xx, dropped connections), "failover"
+    for errors tied to the key (auth, exhausted quota), "fatal" otherwise.
+    Step timeouts are fatal: the timeout is the caller's latency budget.
+    """
+    if isinstance(error, TimeoutError):
+        return "fatal"
+    status = error_status(error)
+    if status in FAILOVER_STATUSES or (status == 429 and "insufficient_quota" in str(error)):
+        return "failover"
+    if status in RETRY_STATUSES:
+        return "retry"
+    if status is None and isinstance(error, (openai.APIConnectionError, ConnectionError)):
+        return "retry"
+    return "fatal"
+
+def retry_after(error):
+    """Seconds from the Retry-After(-Ms) response headers, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(0.0, float(value) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # HTTP-date form
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+def backoff_delay(attempt, server_delay=None):
+    """Delay before retry number `attempt` (1-based); the server's Retry-After wins."""
+    if server_delay is not None:
+        return min(server_delay, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+# --- Scheduling ---
+
+async def _next_attempt(backend, error, attempt, step):
+    """
+    Decides what follows a failed attempt: returns the next attempt number
+    (after sleeping or switching key), or re-raises when there is nothing left.
+    """
+    action = classify_error(error)
+    if action == "fatal":
+        raise error
+    if action == "retry" and attempt <= CALL_RETRIES:
+        step["retries"] += 1
+        await asyncio.sleep(backoff_delay(attempt, retry_after(error)))
+        return attempt + 1
+    # Key rejected, or still throttled after every retry: move to the next vault key.
+    if not backend.next_key():
+        raise error
+    step["failovers"] += 1
+    return 1
+
+async def run_call(backend, call, step):
+    """
+    Runs call() (one provider request with the backend's current key) under the
+    key's rate limit, retrying transient errors with backoff and failing over
+    to the backend's other keys. Only this call is repeated, so the chain
+    resumes at the step that failed rather than starting over.
+    """
+    attempt = 1
+    while True:
+        await get_key_limiter(backend.provider, backend.api_key, backend.base_url).acquire()
+        try:
+            return await call()
+        except Exception as e:
+            attempt = await _next_attempt(backend, e, attempt, step)
+
+async def run_stream(backend, open_stream, step):
+    """
+    run_call() for a streamed reply: a failure before the first delta is retried;
+    once text has been delivered the error is raised instead of repeating it.
+    """
+    attempt = 1
+    while True:
+        await get_key_limiter(backend.provider, backend.api_key, backend.base_url).acquire()
+        delivered = False
+        try:
+            async for delta in open_stream():
+                delivered = True
+                yield delta
+            return
+        except Exception as e:
+            if delivered:
+                raise
+            attempt = await _next_attempt(backend, e, attempt, step)
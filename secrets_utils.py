@@ -1,12 +1,25 @@
 import json
 import os
 import base64
+import hashlib
+import hmac
+import tempfile
+import threading
+import time
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 SECRETS_FILE = "secrets_store.json"
 
+# Derived vault keys are cached in-process only (never on disk) so Streamlit
+# reruns don't pay for PBKDF2 on every widget interaction.
+KEY_CACHE_TTL = 15 * 60  # seconds
+_KEY_CACHE = {}  # (salt_hex, password_fingerprint) -> (key, expires_at)
+_KEY_CACHE_LOCK = threading.Lock()
+# Per-process secret so the cache never holds a plain hash of the password.
+_FINGERPRINT_SECRET = os.urandom(32)
+
 # --- Encryption Utils ---
 
 def _derive_key(password: str, salt: bytes) -> bytes:
@@ -19,10 +32,49 @@ def _derive_key(password: str, salt: bytes) -> bytes:
     )
     return base64.urlsafe_b64encode(kdf.derive(password.encode()))
 
+def _password_fingerprint(password: str) -> str:
+    """Keyed hash identifying a password inside the key cache."""
+    return hmac.new(_FINGERPRINT_SECRET, password.encode(), hashlib.sha256).hexdigest()
+
+def _cache_get_key(password: str, salt: bytes):
+    """Returns a cached derived key, or None if missing/expired."""
+    cache_id = (salt.hex(), _password_fingerprint(password))
+    with _KEY_CACHE_LOCK:
+        entry = _KEY_CACHE.get(cache_id)
+        if entry is None:
+            return None
+        key, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del _KEY_CACHE[cache_id]
+            return None
+        return key
+
+def _cache_put_key(password: str, salt: bytes, key: bytes):
+    cache_id = (salt.hex(), _password_fingerprint(password))
+    with _KEY_CACHE_LOCK:
+        _KEY_CACHE[cache_id] = (key, time.monotonic() + KEY_CACHE_TTL)
+
+def clear_key_cache(password: str = None, salt: bytes = None):
+    """
+    Invalidates cached derived keys.
+    With no arguments everything is dropped; otherwise only the entries
+    matching the given password and/or salt.
+    """
+    fp = _password_fingerprint(password) if password is not None else None
+    salt_hex = salt.hex() if salt is not None else None
+    with _KEY_CACHE_LOCK:
+        for cache_id in list(_KEY_CACHE):
+            if fp is not None and cache_id[1] != fp:
+                continue
+            if salt_hex is not None and cache_id[0] != salt_hex:
+                continue
+            del _KEY_CACHE[cache_id]
+
 def encrypt_data(data_dict: dict, password: str) -> dict:
     """Returns the structure: {'version': 1, 'salt': <hex>, 'data': <encrypted_str>}"""
     salt = os.urandom(16)
     key = _derive_key(password, salt)
+    _cache_put_key(password, salt, key)
     f = Fernet(key)
     
     json_bytes = json.dumps(data_dict).encode('utf-8')
@@ -34,15 +86,141 @@ def encrypt_data(data_dict: dict, password: str) -> dict:
         "data": encrypted.decode('utf-8')
     }
 
-def decrypt_data(store: dict, password: str) -> dict:
-    """Decrypts the store using the provided password. Raises InvalidToken if wrong."""
+def _unlock_store(store: dict, password: str):
+    """Returns (key, data) for an encrypted store. Raises InvalidToken if wrong."""
     salt = bytes.fromhex(store['salt'])
-    key = _derive_key(password, salt)
+    key = _cache_get_key(password, salt)
+    cached = key is not None
+    if not cached:
+        key = _derive_key(password, salt)
     f = Fernet(key)
     
     encrypted_bytes = store['data'].encode('utf-8')
     decrypted_bytes = f.decrypt(encrypted_bytes)
-    return json.loads(decrypted_bytes.decode('utf-8'))
+    # Only remember keys that actually opened the vault
+    if not cached:
+        _cache_put_key(password, salt, key)
+    return key, json.loads(decrypted_bytes.decode('utf-8'))
+
+def decrypt_data(store: dict, password: str) -> dict:
+    """Decrypts the store using the provided password. Raises InvalidToken if wrong."""
+    return _unlock_store(store, password)[1]
+
+def _current_salt():
+    """Salt of the encrypted store on disk, or None."""
+    try:
+        with open(SECRETS_FILE, "r") as f:
+            disk_data = json.load(f)
+        if isinstance(disk_data, dict) and disk_data.get("version", 0) >= 1:
+            return bytes.fromhex(disk_data["salt"])
+    except Exception:
+        pass
+    return None
+
+def lock_vault(password: str):
+    """Forgets the cached key for this password (used by the UI 'Lock' action)."""
+    if password:
+        clear_key_cache(password=password)
+
+def _write_store(store: dict):
+    """Atomically replaces SECRETS_FILE so a crash never leaves a torn vault."""
+    target_dir = os.path.dirname(os.path.abspath(SECRETS_FILE))
+    fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix=".secrets_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(store, f, indent=2)
+        os.replace(tmp_path, SECRETS_FILE)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _provider_list(provider):
+    return "openai_keys" if provider == "OpenAI" else "gemini_keys"
+
+# --- Vault Session ---
+
+class VaultSession:
+    """
+    An unlocked encrypted vault.
+    Holds the Fernet instance and current salt so edits cost one Fernet
+    encrypt + one atomic write instead of a fresh PBKDF2 derivation.
+    The salt only changes through rotate_salt().
+    """
+
+    def __init__(self, fernet: Fernet, salt: bytes, data: dict):
+        self._fernet = fernet
+        self.salt = salt
+        self.data = {
+            "openai_keys": list(data.get("openai_keys", [])),
+            "gemini_keys": list(data.get("gemini_keys", [])),
+        }
+
+    def keys(self, provider):
+        return self.data[_provider_list(provider)]
+
+    def add_key(self, provider, name, key):
+        self.keys(provider).append({"name": name, "key": key})
+
+    def remove_key(self, provider, index):
+        del self.keys(provider)[index]
+
+    def rename_key(self, provider, index, new_name):
+        self.keys(provider)[index]["name"] = new_name
+
+    def to_store(self) -> dict:
+        encrypted = self._fernet.encrypt(json.dumps(self.data).encode('utf-8'))
+        return {
+            "version": 1,
+            "salt": self.salt.hex(),
+            "data": encrypted.decode('utf-8')
+        }
+
+    def save(self) -> bool:
+        try:
+            _write_store(self.to_store())
+            return True
+        except Exception as e:
+            print(f"Error saving: {e}")
+            return False
+
+    def rotate_salt(self, password: str, new_password: str = None) -> bool:
+        """Re-keys the vault with a fresh salt (and optionally a new password)."""
+        old_salt = self.salt
+        new_password = new_password or password
+        self.salt = os.urandom(16)
+        key = _derive_key(new_password, self.salt)
+        _cache_put_key(new_password, self.salt, key)
+        self._fernet = Fernet(key)
+        clear_key_cache(salt=old_salt)
+        return self.save()
+
+def open_vault(password: str):
+    """
+    Unlocks the encrypted store on disk.
+    Returns a VaultSession, or None if the store is missing, plain or the password is wrong.
+    """
+    if not password or not os.path.exists(SECRETS_FILE):
+        return None
+    try:
+        with open(SECRETS_FILE, "r") as f:
+            store = json.load(f)
+        if not (isinstance(store, dict) and store.get("version", 0) >= 1):
+            return None
+        key, data = _unlock_store(store, password)
+        return VaultSession(Fernet(key), bytes.fromhex(store['salt']), data)
+    except Exception as e:
+        print(f"Error opening vault: {e}")
+        return None
+
+def create_vault(data: dict, password: str) -> VaultSession:
+    """Creates a new encrypted store (one KDF) and writes it to disk."""
+    salt = os.urandom(16)
+    key = _derive_key(password, salt)
+    _cache_put_key(password, salt, key)
+    vault = VaultSession(Fernet(key), salt, data)
+    _write_store(vault.to_store())
+    return vault
 
 # --- Core Logic ---
 
@@ -143,41 +321,19 @@ def init_encryption(password: str):
         "gemini_keys": normalize(clean_gemini)
     }
     
-    encrypted_store = encrypt_data(to_encrypt, password)
-    
-    with open(SECRETS_FILE, "w") as f:
-        json.dump(encrypted_store, f, indent=2)
+    old_salt = _current_salt()
+    vault = create_vault(to_encrypt, password)
+    if old_salt:
+        clear_key_cache(salt=old_salt)
+    return vault
 
 def save_secret_encrypted(provider, name, key, password):
     """Saves a new key to the encrypted store."""
-    # Load current with password
-    secrets = load_secrets(password)
-    target_list = "openai_keys" if provider == "OpenAI" else "gemini_keys"
-    
-    # Remove env keys from the list we will save
-    real_keys = [k for k in secrets[target_list] if isinstance(k, dict) and k.get("source") != "env"]
-    
-    # Add new key
-    real_keys.append({"name": name, "key": key})
-    
-    # Prepare full object to re-encrypt
-    # We need the other provider's real keys too
-    other_list = "gemini_keys" if provider == "OpenAI" else "openai_keys"
-    other_keys = [k for k in secrets[other_list] if isinstance(k, dict) and k.get("source") != "env"]
-    
-    to_encrypt = {
-        target_list: real_keys,
-        other_list: other_keys
-    }
-    
-    encrypted_store = encrypt_data(to_encrypt, password)
-    try:
-        with open(SECRETS_FILE, "w") as f:
-            json.dump(encrypted_store, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving: {e}")
+    vault = open_vault(password)
+    if vault is None:
         return False
+    vault.add_key(provider, name, key)
+    return vault.save()
 
 def save_secret_plain(provider, key):
     """Legacy save for unencrypted mode."""
@@ -224,8 +380,7 @@ def save_secret_plain(provider, key):
     other = "gemini_keys" if provider == "OpenAI" else "openai_keys"
     if other not in data: data[other] = []
 
-    with open(SECRETS_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    _write_store(data)
 
 def mask_key_obj(key_obj):
     """Helper to display key object in UI."""
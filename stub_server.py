@@ -0,0 +1,233 @@
+"""
+Deterministic OpenAI-compatible stub server for offline load tests.
+
+    python -m stub_server --port 8765 --latency 0.3 --completion-tokens 300 --error-rate 0.05
+    python -m cli --resume cv.pdf --jobs jobs.jsonl --base-url http://127.0.0.1:8765/v1
+
+Implements POST /v1/chat/completions (plain, JSON mode and SSE streaming) and
+GET /v1/models. Replies depend only on the request and the config, so two runs
+with the same seed produce the same letters, token counts and injected errors.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Vocabulary for generated text (any fixed list keeps output deterministic).
+WORDS = (
+    "delivered scalable services python teams reliability data pipelines customers latency "
+    "improved automated mentored designed shipped production analytics roadmap ownership"
+).split()
+
+# Server behaviour; every key can be overridden per server.
+STUB_DEFAULTS = {
+    "latency": 0.0,           # seconds before the first byte
+    "token_latency": 0.0,     # extra seconds per streamed chunk
+    "completion_tokens": 120, # words per generated reply
+    "chunk_tokens": 8,        # words per streamed chunk
+    "error_rate": 0.0,        # probability of an injected error
+    "fail_every": 0,          # inject an error on every Nth request (0 = never)
+    "error_status": 500,      # HTTP status for injected errors (429, 500, 503...)
+    "retry_after_ms": 10,     # sent with injected errors so clients retry quickly
+    "seed": 0,
+}
+
+def stub_config(**overrides):
+    unknown = set(overrides) - set(STUB_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown stub option(s): {', '.join(sorted(unknown))}")
+    return dict(STUB_DEFAULTS, **overrides)
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+def _words(seed_text, count):
+    digest = hashlib.sha256(seed_text.encode("utf-8")).digest()
+    rng = random.Random(digest)
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+def _draft_header(system):
+    """The header block the draft prompt asks for, so header patching sees real headers."""
+    match = re.search(r"EXACT header:\s*\n(.*?)\n\s*\[Content", system, re.DOTALL)
+    if not match:
+        return ""
+    return "\n".join(line.strip() for line in match.group(1).strip().split("\n")) + "\n\n"
+
+def build_reply(body, config):
+    """Deterministic reply text for a chat.completions request body."""
+    messages = body.get("messages", [])
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    prompt = "\n".join(m.get("content", "") for m in messages)
+    words = _words(prompt, config["completion_tokens"])
+    json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+
+    if json_mode and '"letter"' in prompt:
+        return json.dumps({
+            "company": "Stub Corp", "manager": "Alex Stub", "address": "1 Stub Way",
+            "matches": words[:200], "letter": f"Dear Alex Stub,\n\n{words}",
+        })
+    if json_mode:
+        return json.dumps({
+            "skills": "Python, data pipelines, reliability",
+            "company": "Stub Corp", "manager": "Alex Stub", "address": "1 Stub Way",
+        })
+    if "copywriter" in system:
+        return f"{_draft_header(system)}{words}"
+    return words
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, StubHandler)
+        self.config = config
+        self.stats = {"requests": 0, "errors": 0, "completion_tokens": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def next_request(self):
+        """Counts a request and decides (deterministically) whether it fails."""
+        with self._lock:
+            self.stats["requests"] += 1
+            n = self.stats["requests"]
+        config = self.config
+        fail = bool(config["fail_every"] and n % config["fail_every"] == 0)
+        if not fail and config["error_rate"]:
+            fail = random.Random(config["seed"] * 1_000_003 + n).random() < config["error_rate"]
+        if fail:
+            with self._lock:
+                self.stats["errors"] += 1
+        return fail
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON body", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+
+        config = self.server.config
+        if config["latency"]:
+            time.sleep(config["latency"])
+        if self.server.next_request():
+            status = config["error_status"]
+            self._send_json(status, {"error": {"message": f"injected error ({status})", "type": "stub_error"}},
+                            {"retry-after-ms": str(config["retry_after_ms"])})
+            return
+
+        text = build_reply(body, config)
+        prompt_tokens = _estimate_tokens("".join(m.get("content", "") for m in body.get("messages", [])))
+        # One token per generated word, so completion_tokens maps 1:1 to usage
+        completion_tokens = len(text.split())
+        with self.server._lock:
+            self.server.stats["completion_tokens"] += completion_tokens
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model", "stub-model")}
+
+        if body.get("stream"):
+            self._stream(text, usage, base, (body.get("stream_options") or {}).get("include_usage"))
+            return
+        self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[{
+            "index": 0, "finish_reason": "stop",
+            "message": {"role": "assistant", "content": text},
+        }]))
+
+    def _stream(self, text, usage, base, include_usage):
+        config = self.server.config
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        tokens = re.findall(r"\S+\s*|\s+", text)
+        for i in range(0, len(tokens), max(1, config["chunk_tokens"])):
+            if config["token_latency"]:
+                time.sleep(config["token_latency"])
+            event(dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0, "finish_reason": None,
+                "delta": {"content": "".join(tokens[i:i + config["chunk_tokens"]])},
+            }]))
+        event(dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if include_usage:
+            event(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def start_stub_server(host="127.0.0.1", port=0, **config):
+    """
+    Starts a stub server in a daemon thread (port=0 picks a free port).
+    Use server.url as an OpenAI base_url; server.stop() shuts it down.
+    """
+    server = StubServer((host, port), stub_config(**config))
+    threading.Thread(target=server.serve_forever, name="llm-stub-server", daemon=True).start()
+    return server
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m stub_server", description="Deterministic OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for name, value in STUB_DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    return parser
+
+def main(argv=None):
+    args = vars(build_parser().parse_args(argv))
+    host, port = args.pop("host"), args.pop("port")
+    server = StubServer((host, port), stub_config(**args))
+    print(f"Stub LLM server on {server.url} ({args})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {server.stats}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import os
+import time
+
+# USD per 1M tokens: (prompt, completion). Longest matching prefix wins, so
+# "models/gemini-1.5-flash-001" prices as "gemini-1.5-flash".
+PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.0-pro": (0.50, 1.50),
+    "gemini-pro": (0.50, 1.50),
+}
+
+# Optional JSON file {"model-prefix": [prompt_usd_per_m, completion_usd_per_m]} merged over PRICING.
+PRICING_FILE = os.getenv("LLM_PRICING_FILE")
+
+STEPS = ("extract", "match", "draft", "fused")
+STEP_FIELDS = ("wall", "ttfb", "prompt_tokens", "completion_tokens", "total_tokens", "calls", "retries", "failovers", "cache_hit", "cost")
+
+def _load_pricing():
+    pricing = dict(PRICING)
+    if PRICING_FILE:
+        try:
+            with open(PRICING_FILE, "r") as f:
+                pricing.update({k: tuple(v) for k, v in json.load(f).items()})
+        except Exception as e:
+            print(f"Pricing file error ({PRICING_FILE}): {e}")
+    return pricing
+
+_pricing = _load_pricing()
+
+# --- Per-step records ---
+
+def new_step():
+    """Telemetry for one chain step; backends fill in tokens and ttfb."""
+    return {"wall": 0.0, "ttfb": None, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+            "calls": 0, "retries": 0, "failovers": 0, "cache_hit": False, "cost": 0.0}
+
+def add_tokens(step, prompt_tokens, completion_tokens, total_tokens=None):
+    step["prompt_tokens"] += prompt_tokens
+    step["completion_tokens"] += completion_tokens
+    step["total_tokens"] += total_tokens if total_tokens is not None else prompt_tokens + completion_tokens
+
+def first_byte(step, start):
+    """Records the time to the first response byte (first call of the step only)."""
+    if step["ttfb"] is None:
+        step["ttfb"] = time.perf_counter() - start
+
+def model_price(model_name):
+    """(prompt, completion) USD per 1M tokens, or None for unknown models."""
+    name = (model_name or "").split("/")[-1]
+    matches = [prefix for prefix in _pricing if name.startswith(prefix)]
+    return _pricing[max(matches, key=len)] if matches else None
+
+def estimate_cost(model_name, prompt_tokens, completion_tokens):
+    price = model_price(model_name)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+def finalize_usage(usage, model_name):
+    """
+    Prices every step and rolls the step records up into the usage dict:
+    prompt/completion/total tokens, cost_est (None if the model is not priced),
+    and the legacy char counters for backends that report them.
+    """
+    steps = usage.get("steps", {})
+    priced = model_price(model_name) is not None
+    for record in steps.values():
+        record["wall"] = round(record["wall"], 3)
+        if record["ttfb"] is not None:
+            record["ttfb"] = round(record["ttfb"], 3)
+        cost = estimate_cost(model_name, record["prompt_tokens"], record["completion_tokens"])
+        record["cost"] = round(cost, 6) if cost is not None else None
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        usage[field] = sum(r[field] for r in steps.values())
+    for field in ("input_chars", "output_chars"):
+        if field in usage:
+            usage[field] = sum(r.get(field, 0) for r in steps.values())
+    usage["model"] = model_name
+    usage["cost_est"] = round(sum(r["cost"] for r in steps.values() if r["cost"]), 6) if priced else None
+    return usage
+
+# --- Session aggregation / export ---
+
+def record_from_result(result, provider=None, job_id=None):
+    """One flat monitoring record per generation (JSON-serialisable)."""
+    usage = result.get("usage") or {}
+    record = {
+        "ts": round(time.time(), 3),
+        "job_id": job_id,
+        "provider": provider,
+        "model": usage.get("model"),
+        "mode": usage.get("mode"),
+        "ok": bool(result.get("ok")),
+        "error": result.get("error"),
+        "wall": (usage.get("timings") or {}).get("total"),
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+        "cost_est": usage.get("cost_est"),
+        "cache_hits": len(usage.get("cache_hits", [])),
+    }
+    for step, data in (usage.get("steps") or {}).items():
+        for field in STEP_FIELDS:
+            record[f"{step}_{field}"] = data.get(field)
+    return record
+
+def summarize_records(records):
+    """
+    Session roll-up for the sidebar: totals plus per-step mean wall time / TTFB
+    and total tokens, over the generations that ran each step.
+    """
+    summary = {
+        "generations": len(records),
+        "failures": sum(1 for r in records if not r["ok"]),
+        "total_tokens": sum(r["total_tokens"] or 0 for r in records),
+        "cost_est": round(sum(r["cost_est"] or 0 for r in records), 6),
+        "steps": {},
+    }
+    for step in STEPS:
+        rows = [r for r in records if r.get(f"{step}_calls") is not None]
+        if not rows:
+            continue
+        walls = [r[f"{step}_wall"] for r in rows if not r[f"{step}_cache_hit"]]
+        ttfbs = [r[f"{step}_ttfb"] for r in rows if r[f"{step}_ttfb"] is not None]
+        summary["steps"][step] = {
+            "runs": len(rows),
+            "cache_hits": sum(1 for r in rows if r[f"{step}_cache_hit"]),
+            "mean_wall": round(sum(walls) / len(walls), 3) if walls else None,
+            "mean_ttfb": round(sum(ttfbs) / len(ttfbs), 3) if ttfbs else None,
+            "tokens": sum(r[f"{step}_total_tokens"] or 0 for r in rows),
+            "retries": sum(r[f"{step}_retries"] or 0 for r in rows),
+            "failovers": sum(r.get(f"{step}_failovers") or 0 for r in rows),
+        }
+    return summary
+
+def export_records(records, fmt="jsonl"):
+    """Serialises monitoring records as JSONL or CSV text."""
+    if fmt == "jsonl":
+        return "".join(json.dumps(r) + "\n" for r in records)
+    if fmt == "csv":
+        fields = []
+        for r in records:
+            fields.extend(k for k in r if k not in fields)
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(records)
+        return out.getvalue()
+    raise ValueError(f"Unknown telemetry format: {fmt}")
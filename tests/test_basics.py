@@ -41,6 +41,67 @@ class TestBasics(unittest.TestCase):
         with self.assertRaises(Exception):
             secrets_utils.decrypt_data(encrypted, "wrong")
 
+    def test_derived_key_cache(self):
+        """Repeated decrypts with the same password should only run the KDF once."""
+        from unittest import mock
+        secrets_utils.clear_key_cache()
+        encrypted = secrets_utils.encrypt_data({"k": "v"}, "pw")
+        secrets_utils.clear_key_cache()
+
+        with mock.patch.object(secrets_utils, "_derive_key", wraps=secrets_utils._derive_key) as kdf:
+            secrets_utils.decrypt_data(encrypted, "pw")
+            secrets_utils.decrypt_data(encrypted, "pw")
+            self.assertEqual(kdf.call_count, 1)
+
+            # Lock drops the key, so the next unlock derives again
+            secrets_utils.lock_vault("pw")
+            secrets_utils.decrypt_data(encrypted, "pw")
+            self.assertEqual(kdf.call_count, 2)
+
+            # A wrong password is never cached
+            for _ in range(2):
+                with self.assertRaises(Exception):
+                    secrets_utils.decrypt_data(encrypted, "wrong")
+            self.assertEqual(kdf.call_count, 4)
+
+    def test_vault_session_single_kdf(self):
+        """Key edits on an unlocked vault reuse its key and salt."""
+        import tempfile
+        from unittest import mock
+        secrets_utils.clear_key_cache()
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, "secrets_store.json")
+            with mock.patch.object(secrets_utils, "SECRETS_FILE", store_path), \
+                 mock.patch.dict(os.environ, {}, clear=True), \
+                 mock.patch.object(secrets_utils, "_derive_key", wraps=secrets_utils._derive_key) as kdf:
+                secrets_utils.init_encryption("pw")
+                self.assertEqual(kdf.call_count, 1)
+                with open(store_path) as f:
+                    salt = json.load(f)["salt"]
+
+                self.assertTrue(secrets_utils.save_secret_encrypted("OpenAI", "Work", "sk-111", "pw"))
+                self.assertTrue(secrets_utils.save_secret_encrypted("Gemini", "Home", "g-222", "pw"))
+                self.assertEqual(kdf.call_count, 1)
+                with open(store_path) as f:
+                    self.assertEqual(json.load(f)["salt"], salt)
+
+                vault = secrets_utils.open_vault("pw")
+                vault.rename_key("OpenAI", 0, "Renamed")
+                vault.remove_key("Gemini", 0)
+                self.assertTrue(vault.save())
+                loaded = secrets_utils.load_secrets("pw")
+                self.assertEqual(loaded["openai_keys"], [{"name": "Renamed", "key": "sk-111"}])
+                self.assertEqual(loaded["gemini_keys"], [])
+                self.assertEqual(kdf.call_count, 1)
+
+                # Salt rotation is explicit and costs exactly one KDF
+                self.assertTrue(vault.rotate_salt("pw"))
+                self.assertEqual(kdf.call_count, 2)
+                with open(store_path) as f:
+                    self.assertNotEqual(json.load(f)["salt"], salt)
+                self.assertIsNone(secrets_utils.open_vault("wrong"))
+        secrets_utils.clear_key_cache()
+
     def test_latex_escape(self):
         """Test latex escaping logic via export_utils internal helper or indirect output."""
         # Using a dummy dict to call create_latex
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_utils
+import utils
+
+class TestBatch(unittest.TestCase):
+
+    def test_job_parsing(self):
+        jobs = batch_utils.parse_pasted_jobs("Engineer at A\n---\n\nDesigner at B\n ---- \n")
+        self.assertEqual([j["job_description"] for j in jobs], ["Engineer at A", "Designer at B"])
+
+        rows = ['{"id": "acme", "jd": "Role A", "date_str": "May 1"}', "", '{"job_description": "Role B"}']
+        jobs = batch_utils.parse_jsonl_jobs(rows, source="jobs.jsonl")
+        self.assertEqual(jobs[0], {"id": "acme", "job_description": "Role A", "date_str": "May 1"})
+        self.assertEqual(jobs[1]["id"], "jobs.jsonl:3")
+        with self.assertRaises(ValueError):
+            batch_utils.parse_jsonl_jobs(['{"id": 1}'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("b.txt", "a.txt", "notes.md"):
+                with open(os.path.join(tmp, name), "w") as f:
+                    f.write(f"JD {name}")
+            self.assertEqual([j["id"] for j in batch_utils.load_jobs_from_folder(tmp)], ["a", "b"])
+
+    def test_bounded_concurrency_and_retry(self):
+        state = {"active": 0, "peak": 0, "calls": {}}
+
+        async def fake_generate(cv_text, jd, *args, **kwargs):
+            state["calls"][jd] = state["calls"].get(jd, 0) + 1
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.02)
+            state["active"] -= 1
+            if jd == "flaky" and state["calls"][jd] == 1:
+                return {"ok": False, "error": "Step 2 (Matching) failed: 503", "usage": {}}
+            return {"ok": True, "text": f"Letter for {jd}", "usage": {"total_tokens": 5}}
+
+        jobs = [{"id": str(i), "job_description": f"jd {i}"} for i in range(8)]
+        jobs.append({"id": "f", "job_description": "flaky"})
+        with mock.patch.object(utils, "generate_cover_letter_async", fake_generate), \
+             mock.patch.dict(batch_utils.PROVIDER_RATE_LIMITS, {"OpenAI": 6000}):
+            results = list(batch_utils.run_batch("cv", jobs, "sk-x", "OpenAI", {}, concurrency=3))
+
+        self.assertEqual(len(results), 9)
+        self.assertTrue(all(r["status"] == "ok" for r in results))
+        self.assertLessEqual(state["peak"], 3)
+        flaky = next(r for r in results if r["id"] == "f")
+        self.assertEqual(flaky["attempts"], 2)
+        self.assertEqual(batch_utils.summarize([flaky])[0]["tokens"], 5)
+
+if __name__ == '__main__':
+    unittest.main()
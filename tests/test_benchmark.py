@@ -0,0 +1,39 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_measure_stats(self):
+        stats = benchmark.measure(lambda: sum(range(1000)), repeat=3)
+        self.assertEqual(stats["repeat"], 3)
+        self.assertLessEqual(stats["min"], stats["median"])
+        self.assertLessEqual(stats["median"], stats["max"])
+        self.assertIn("peak_kb", stats)
+
+    def test_results_file_and_compare(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "results.json")
+            self.assertEqual(benchmark.main(["--quick", "--only", "export", "--out", out]), 0)
+            with open(out) as f:
+                report = json.load(f)
+        names = {r["name"] for r in report["results"]}
+        self.assertEqual(names, {"create_docx", "create_pdf", "create_latex"})
+        self.assertIn("commit", report["meta"])
+
+        slower = json.loads(json.dumps(report))
+        for row in slower["results"]:
+            row["stats"]["median"] *= 2
+        rows = benchmark.compare_results(report, slower)
+        self.assertEqual(len(rows), len(report["results"]))
+        self.assertTrue(all(r["regression"] for r in rows))
+        self.assertFalse(any(r["regression"] for r in benchmark.compare_results(report, report)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_utils
+import client_utils
+import utils
+
+class TestCaches(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._dir_patch = mock.patch.object(cache_utils, "CACHE_DIR", self._tmp.name)
+        self._dir_patch.start()
+
+    def tearDown(self):
+        self._dir_patch.stop()
+        self._tmp.cleanup()
+
+    def test_lru_eviction_and_ttl(self):
+        cache = cache_utils.LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        evicted = cache.set("c", 3)
+        self.assertEqual(evicted, [("b", 2)])
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+
+        expiring = cache_utils.LRUCache(ttl=0.01)
+        expiring.set("k", "v")
+        time.sleep(0.02)
+        self.assertIsNone(expiring.get("k"))
+
+    def test_gemini_model_discovery_cached(self):
+        """list_models runs once per key; the snapshot survives a restart."""
+        models = ["models/gemini-1.0-pro", "models/gemini-1.5-flash-001", "models/gemini-1.5-pro"]
+        utils._gemini_models.clear()
+        with mock.patch.object(utils, "_list_gemini_models", return_value=models) as listing:
+            self.assertEqual(utils.get_gemini_models("key-1"), models)
+            self.assertEqual(utils.get_gemini_models("key-1"), models)
+            self.assertEqual(listing.call_count, 1)
+
+            # Simulate a new process: memory empty, snapshot on disk
+            utils._gemini_models.clear()
+            utils._gemini_snapshot_loaded = False
+            self.assertEqual(utils.get_gemini_models("key-1"), models)
+            self.assertEqual(listing.call_count, 1)
+
+            # A 404 invalidates the entry
+            utils.invalidate_gemini_models("key-1")
+            utils.get_gemini_models("key-1")
+            self.assertEqual(listing.call_count, 2)
+
+        self.assertEqual(utils.select_gemini_model(models, "gemini-1.5-pro"), "models/gemini-1.5-pro")
+        self.assertEqual(utils.select_gemini_model(models, "gemini-1.5-flash"), "models/gemini-1.5-flash-001")
+        self.assertEqual(utils.select_gemini_model(models, "gemini-ultra"), "models/gemini-1.5-flash-001")
+        utils._gemini_models.clear()
+
+    def test_pdf_extraction_cache(self):
+        """Same bytes -> one parse; the disk tier survives a memory flush."""
+        from io import BytesIO
+        from fpdf import FPDF
+        pdf = FPDF()
+        pdf.set_font("Helvetica", size=12)
+        for i in range(2):
+            pdf.add_page()
+            pdf.cell(0, 10, f"Page {i} experience")
+        upload = BytesIO(bytes(pdf.output()))
+
+        utils._pdf_cache.clear()
+        with mock.patch.object(utils, "_parse_pdf", wraps=utils._parse_pdf) as parse:
+            first = utils.extract_pdf(upload, use_disk_cache=True)
+            self.assertEqual(utils.extract_text_from_pdf(upload), first["text"])
+            self.assertEqual(parse.call_count, 1)
+
+            utils._pdf_cache.clear()
+            self.assertEqual(utils.extract_pdf(upload, use_disk_cache=True), first)
+            self.assertEqual(parse.call_count, 1)
+
+        self.assertEqual(first["page_count"], 2)
+        self.assertIn("Page 1 experience", first["text"][first["page_offsets"][1]:])
+        utils._pdf_cache.clear()
+
+    def test_pdf_parallel_and_capped_extraction(self):
+        from fpdf import FPDF
+        pdf = FPDF()
+        pdf.set_font("Helvetica", size=12)
+        for i in range(30):
+            pdf.add_page()
+            pdf.cell(0, 10, f"Page {i}")
+        pdf_bytes = bytes(pdf.output())
+
+        serial = {p["page"]: p["text"] for p in utils.iter_pdf_pages(pdf_bytes, parallel=False)}
+        parallel = {p["page"]: p["text"] for p in utils.iter_pdf_pages(pdf_bytes, parallel=True)}
+        self.assertEqual(len(serial), 30)
+        self.assertEqual(serial, parallel)
+
+        capped = list(utils.iter_pdf_pages(pdf_bytes, max_pages=5, parallel=False))
+        self.assertEqual([p["page"] for p in capped], [0, 1, 2, 3, 4])
+        self.assertEqual(sum(len(p["text"]) for p in utils.iter_pdf_pages(pdf_bytes, max_chars=10)), 10)
+        # Parallel runs finish in any order, but the char cap keeps a prefix of the document
+        prefix = sum(len(serial[i]) for i in range(3)) + 2
+        for _ in range(3):
+            capped = list(utils.iter_pdf_pages(pdf_bytes, max_chars=prefix, parallel=True))
+            self.assertEqual([p["page"] for p in capped], [0, 1, 2, 3])
+
+        # The character cap cutting the last page short counts as truncation
+        one_page = FPDF()
+        one_page.set_font("Helvetica", size=12)
+        one_page.add_page()
+        one_page.cell(0, 10, "Only page")
+        one_page = bytes(one_page.output())
+        full = utils._parse_pdf(one_page)
+        self.assertFalse(full["truncated"])
+        with mock.patch.object(utils, "PDF_MAX_CHARS", len(full["text"]) - 1):
+            cut = utils._parse_pdf(one_page)
+        self.assertEqual(len(cut["page_offsets"]), 1)
+        self.assertTrue(cut["truncated"])
+
+        # A broken page is skipped and reported, not fatal
+        real = utils._extract_page
+        def flaky(reader, index):
+            if index == 3:
+                raise ValueError("bad page")
+            return real(reader, index)
+        with mock.patch.object(utils, "_extract_page", flaky), \
+             mock.patch.object(utils, "PDF_MAX_PAGES", 10):
+            result = utils._parse_pdf(pdf_bytes)
+        self.assertEqual(result["skipped_pages"], [{"page": 3, "error": "bad page"}])
+        self.assertEqual(len(result["page_offsets"]), 9)
+        self.assertTrue(result["truncated"])
+        self.assertNotIn("Page 3", result["text"])
+
+    def test_clear_caches_after_factory_reset(self):
+        import shutil
+        utils._step1_cache.reload()
+        utils._step1_cache.set("k", {"skills": "Python"})
+        utils._draft_cache.set("d", {"text": "letter"})
+        utils._pdf_cache.set("p", {"text": "cv"})
+        shutil.rmtree(self._tmp.name)  # what the reset button deletes
+        utils.clear_caches()
+        for cache in (utils._step1_cache, utils._draft_cache, utils._pdf_cache, utils._gemini_models):
+            self.assertEqual(len(cache), 0)
+        # Nothing comes back from memory into the new snapshot
+        utils._step1_cache.set("new", {"skills": "Go"})
+        self.assertEqual([k for k, _ in cache_utils.load_snapshot("step1_cache.json")["entries"]], ["new"])
+        utils._step1_cache.reload()
+
+    def test_client_registry_reuse_and_eviction(self):
+        client_utils.clear_clients()
+        with mock.patch.object(client_utils, "MAX_CLIENTS", 2):
+            a = client_utils.get_openai_client("sk-a")
+            self.assertIs(client_utils.get_openai_client("sk-a"), a)
+            self.assertIsNot(client_utils.get_openai_client("sk-a", base_url="http://localhost:9/v1"), a)
+            client_utils.get_openai_client("sk-a")
+
+            client_utils.get_openai_client("sk-b")  # evicts the base_url client
+            self.assertEqual(client_utils.pool_size(), 2)
+            self.assertIs(client_utils.get_openai_client("sk-a"), a)
+
+            g1 = client_utils.get_gemini_model("g-1", "models/gemini-1.5-flash")
+            g2 = client_utils.get_gemini_model("g-2", "models/gemini-1.5-flash")
+            self.assertIsNot(g1._client, g2._client)
+        client_utils.clear_clients()
+
+if __name__ == '__main__':
+    unittest.main()
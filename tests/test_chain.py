@@ -0,0 +1,260 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_utils
+import client_utils
+import scheduler_utils
+import utils
+
+USER_INFO = {"name": "Test User", "email": "t@example.com", "phone": "1", "linkedin": "in/test", "address": "1 St"}
+
+class FakeCompletions:
+    """Stands in for AsyncOpenAI().chat.completions."""
+
+    def __init__(self, delay=0.0, slow_step=None, fail_step=None):
+        self.delay = delay
+        self.slow_step = slow_step
+        self.fail_step = fail_step
+        self.calls = 0
+        self.draft_text = None
+        self.json_text = None
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.calls == self.fail_step:
+            raise ValueError("bad request")  # not retryable
+        await asyncio.sleep(10 if self.calls == self.slow_step else self.delay)
+        if kwargs.get("stream"):
+            return self._stream(["Dear ", "Jane", ","])
+        if kwargs.get("response_format") and self.json_text:
+            content = self.json_text
+        elif kwargs.get("response_format"):
+            content = json.dumps({"skills": "Python", "company": "Acme", "manager": "Jane", "address": "NYC"})
+        else:
+            is_draft = "copywriter" in kwargs["messages"][0]["content"]
+            content = self.draft_text if self.draft_text and is_draft else f"reply {self.calls}"
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(total_tokens=10),
+        )
+
+    async def _stream(self, pieces):
+        for piece in pieces:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+        # Final usage-only chunk (stream_options={"include_usage": True})
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=7))
+
+def fake_openai(completions):
+    return mock.patch.object(
+        client_utils, "get_async_openai_client",
+        return_value=SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+    )
+
+class ChainTestCase(unittest.TestCase):
+    """Points the persistent caches at a temp dir so tests never share results."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._dir_patch = mock.patch.object(cache_utils, "CACHE_DIR", self._tmp.name)
+        self._dir_patch.start()
+        utils._step1_cache.reload()
+        utils._step2_cache.clear()
+        utils._draft_cache.clear()
+
+    def tearDown(self):
+        self._dir_patch.stop()
+        utils._step1_cache.reload()
+        self._tmp.cleanup()
+
+class TestAsyncChain(ChainTestCase):
+
+    def test_sync_wrapper(self):
+        with fake_openai(FakeCompletions()):
+            result = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", USER_INFO, "gpt-4o", "Jan 1")
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["text"], "reply 3")
+        self.assertEqual(result["usage"]["total_tokens"], 30)
+        self.assertEqual(result["hr_info_debug"]["company"], "Acme")
+        # Step 1 skills were "Python" and the CV does not mention it
+        self.assertEqual(result["usage"]["match"]["missing"], ["Python"])
+        self.assertEqual(result["usage"]["retrieval"]["chunks"], 1)
+
+    def test_inputs_compacted(self):
+        jd = "Engineer\n\nWe are an equal opportunity employer."
+        with fake_openai(FakeCompletions()):
+            result = utils.generate_cover_letter("cv", jd, "sk-x", "OpenAI", USER_INFO, "gpt-4o")
+            full = utils.generate_cover_letter("cv", jd, "sk-x", "OpenAI", USER_INFO, "gpt-4o", compact=False)
+        compaction = result["usage"]["compaction"]
+        self.assertLess(compaction["jd"]["after"], compaction["jd"]["before"])
+        self.assertGreater(compaction["saved_tokens"], 0)
+        self.assertNotIn("compaction", full["usage"])
+
+    def test_step_timeout(self):
+        with fake_openai(FakeCompletions(slow_step=2)):
+            result = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", USER_INFO, "gpt-4o", step_timeout=0.05)
+        self.assertFalse(result["ok"])
+        self.assertIn("Step 2 (Matching) failed: timed out", result["error"])
+
+    def test_streaming_draft(self):
+        with fake_openai(FakeCompletions()):
+            stream = utils.generate_cover_letter_stream("cv", "jd", "sk-x", "OpenAI", USER_INFO)
+            deltas = list(stream)
+        self.assertEqual(deltas, ["Dear ", "Jane", ","])
+        self.assertTrue(stream.result["ok"])
+        self.assertEqual(stream.result["text"], "Dear Jane,")
+        # Steps 1-2 (10 each) + usage chunk from the stream
+        self.assertEqual(stream.result["usage"]["total_tokens"], 27)
+
+    def test_concurrent_generations_share_one_loop(self):
+        completions = FakeCompletions(delay=0.05)
+
+        async def many():
+            jobs = [utils.generate_cover_letter_async("cv", f"jd {i}", "sk-x", "OpenAI", USER_INFO) for i in range(20)]
+            return await asyncio.gather(*jobs)
+
+        # 60 calls on one key: lift the per-key budget so only concurrency is measured
+        with fake_openai(completions), mock.patch.dict(scheduler_utils.KEY_RATE_LIMITS, {"OpenAI": 60000}):
+            start = time.perf_counter()
+            results = asyncio.run(many())
+            elapsed = time.perf_counter() - start
+        self.assertTrue(all(r["ok"] for r in results))
+        self.assertEqual(completions.calls, 60)
+        # 20 x 3 serial steps of 50ms would take 3s
+        self.assertLess(elapsed, 1.0)
+
+class TestPipelinedMode(ChainTestCase):
+
+    def test_pipelined_overlaps_steps(self):
+        completions = FakeCompletions(delay=0.1)
+        with fake_openai(completions):
+            serial = utils.generate_cover_letter("cv", "jd A", "sk-x", "OpenAI", USER_INFO, "gpt-4o", "Jan 1")
+            pipelined = utils.generate_cover_letter("cv", "jd B", "sk-x", "OpenAI", USER_INFO, "gpt-4o", "Jan 1", mode="pipelined")
+        self.assertTrue(pipelined["ok"])
+        self.assertEqual(pipelined["usage"]["mode"], "pipelined")
+        self.assertEqual(pipelined["usage"]["total_tokens"], 30)
+        self.assertEqual(pipelined["hr_info_debug"]["manager"], "Jane")
+        # Two round trips instead of three
+        self.assertLess(pipelined["usage"]["timings"]["total"], serial["usage"]["timings"]["total"] - 0.05)
+
+    def test_pipelined_step_failure_is_labelled(self):
+        with fake_openai(FakeCompletions(slow_step=1)):
+            result = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", USER_INFO, mode="pipelined", step_timeout=0.05)
+        self.assertFalse(result["ok"])
+        self.assertIn("Step 1 (Extraction) failed: timed out", result["error"])
+
+    def test_pipelined_match_fails_while_extract_runs(self):
+        # Call 1 (extract) is slow, call 2 (match) fails at once
+        with fake_openai(FakeCompletions(slow_step=1, fail_step=2)):
+            result = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", USER_INFO, mode="pipelined", step_timeout=5)
+        self.assertFalse(result["ok"])
+        self.assertIn("Step 2 (Matching) failed: bad request", result["error"])
+
+    def test_latency_report(self):
+        completions = FakeCompletions(delay=0.02)
+        with fake_openai(completions):
+            report = utils.compare_plans("cv", "jd", "sk-x", "OpenAI", USER_INFO, "gpt-4o", runs=2)
+        self.assertEqual(set(report), {"chain", "pipelined", "fused"})
+        self.assertEqual(report["chain"]["runs"], 2)
+        # Caches are bypassed, so every run makes all three calls (fused falls back: 1 + 3)
+        self.assertEqual(completions.calls, 20)
+        self.assertEqual(report["fused"]["fallbacks"], 2)
+        self.assertTrue(utils.format_latency_report(report).splitlines()[2].startswith("pipelined"))
+        self.assertEqual(len(utils._draft_cache), 0)
+
+class TestFusedMode(ChainTestCase):
+
+    def test_fused_single_call(self):
+        completions = FakeCompletions()
+        completions.json_text = json.dumps({
+            "company": "Acme", "manager": "Jane", "address": "NYC",
+            "matches": "Python at Foo", "letter": "Dear Jane,\n\nBody.",
+        })
+        with fake_openai(completions):
+            result = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", USER_INFO, "gpt-4o", mode="fused")
+        self.assertTrue(result["ok"])
+        self.assertEqual(completions.calls, 1)
+        self.assertEqual(result["text"], "Dear Jane,\n\nBody.")
+        self.assertEqual(result["hr_info_debug"], {"company": "Acme", "manager": "Jane", "address": "NYC"})
+        self.assertEqual(result["usage"]["mode"], "fused")
+        self.assertIn("fused", result["usage"]["timings"])
+        self.assertNotIn("fallback", result["usage"])
+
+    def test_fused_falls_back_on_schema_failure(self):
+        completions = FakeCompletions()
+        completions.json_text = json.dumps({"company": "Acme", "letter": ""})
+        with fake_openai(completions):
+            result = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", USER_INFO, "gpt-4o", mode="fused")
+        self.assertTrue(result["ok"])
+        self.assertEqual(completions.calls, 4)
+        self.assertIn("manager", result["usage"]["fallback"])
+        self.assertIsNone(utils.parse_fused_response("not json")[0])
+
+class TestStepCaches(ChainTestCase):
+
+    def test_step1_cache_hit(self):
+        completions = FakeCompletions()
+        with fake_openai(completions):
+            first = utils.generate_cover_letter("cv", "Senior  Engineer\nat Acme", "sk-x", "OpenAI", USER_INFO, "gpt-4o")
+            # Same JD modulo whitespace -> Step 1 is served from the cache
+            second = utils.generate_cover_letter("cv 2", "Senior Engineer at Acme ", "sk-x", "OpenAI", USER_INFO, "gpt-4o")
+        self.assertNotIn("cache_hits", first["usage"])
+        self.assertEqual(second["usage"]["cache_hits"], ["extract"])
+        self.assertEqual(second["hr_info_debug"]["company"], "Acme")
+        self.assertEqual(completions.calls, 5)
+
+        # Persisted across processes, keyed by model as well
+        utils._step1_cache.reload()
+        with fake_openai(FakeCompletions()):
+            again = utils.generate_cover_letter("cv 3", "Senior Engineer at Acme", "sk-x", "OpenAI", USER_INFO, "gpt-4o")
+            other_model = utils.generate_cover_letter("cv 3", "Senior Engineer at Acme", "sk-x", "OpenAI", USER_INFO, "gpt-3.5-turbo")
+        self.assertEqual(again["usage"]["cache_hits"], ["extract"])
+        self.assertNotIn("cache_hits", other_model["usage"])
+
+    def test_pipeline_reuse_and_header_patch(self):
+        header = "\n".join(utils._header_lines(USER_INFO, "Jan 1")) + "\n\nJane\nAcme\nNYC\n\nDear Jane,\n\nBody."
+        completions = FakeCompletions()
+        completions.draft_text = header
+        with fake_openai(completions):
+            first = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", USER_INFO, "gpt-4o", "Jan 1")
+            self.assertEqual(completions.calls, 3)
+
+            # New date + email: header patched locally, no LLM call
+            new_info = dict(USER_INFO, email="new@example.com")
+            patched = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", new_info, "gpt-4o", "Feb 2")
+            self.assertEqual(completions.calls, 3)
+            self.assertEqual(patched["usage"]["cache_hits"], ["extract", "match", "draft"])
+            self.assertIn("1 St | new@example.com | 1", patched["text"])
+            self.assertIn("Feb 2", patched["text"])
+            self.assertNotIn("Jan 1", patched["text"])
+            self.assertTrue(patched["text"].endswith("Dear Jane,\n\nBody."))
+
+            # Forcing a fresh draft only re-runs Step 3
+            fresh = utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", USER_INFO, "gpt-4o", "Jan 1", reuse_draft=False)
+            self.assertEqual(completions.calls, 4)
+            self.assertEqual(fresh["usage"]["cache_hits"], ["extract", "match"])
+            self.assertTrue(fresh["usage"]["steps"]["match"]["cache_hit"])
+            self.assertEqual(fresh["usage"]["steps"]["draft"]["calls"], 1)
+            self.assertEqual(fresh["usage"]["total_tokens"], 10)
+        self.assertTrue(first["ok"])
+
+        # A header that can't be located is not patched
+        self.assertIsNone(utils.patch_letter_header("Dear Jane,", USER_INFO, "Jan 1", USER_INFO, "Feb 2"))
+        # A new name is also in the sign-off: no patch, the draft step runs again
+        letter = "\n".join(utils._header_lines(USER_INFO, "Jan 1")) + "\n\nDear Jane,\n\nSincerely,\n" + USER_INFO["name"]
+        renamed = dict(USER_INFO, name="Bob Jones")
+        self.assertIsNone(utils.patch_letter_header(letter, USER_INFO, "Jan 1", renamed, "Jan 1"))
+        with fake_openai(completions):
+            utils.generate_cover_letter("cv", "jd", "sk-x", "OpenAI", renamed, "gpt-4o", "Jan 1")
+            self.assertEqual(completions.calls, 5)
+
+if __name__ == '__main__':
+    unittest.main()
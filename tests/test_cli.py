@@ -0,0 +1,49 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_utils
+import cli
+
+class TestCLI(unittest.TestCase):
+
+    def test_import_does_not_load_streamlit(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = "import sys, cli; print('streamlit' in sys.modules)"
+        out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True)
+        self.assertEqual(out.stdout.strip(), "False")
+
+    def test_bulk_run_writes_exports(self):
+        def fake_batch(cv_text, jobs, *args, **kwargs):
+            for job in jobs:
+                yield {"id": job["id"], "status": "ok", "attempts": 1, "elapsed": 0.1,
+                       "usage": {"total_tokens": 3}, "error": None, "job": job,
+                       "result": {"ok": True, "text": f"Dear Team,\n\n{job['job_description']}", "hr_info_debug": {}}}
+
+        stdin = io.StringIO("".join(json.dumps({"id": job_id, "job_description": "Build things"}) + "\n"
+                                    for job_id in ("acme/role 1", "acme_role_1", "Acme role 1")))
+        with tempfile.TemporaryDirectory() as out, \
+             mock.patch.object(cli, "resolve_api_keys", return_value=["sk-x"]), \
+             mock.patch.object(cli.utils, "extract_text_from_pdf", return_value="cv text"), \
+             mock.patch.object(batch_utils, "run_batch", fake_batch), \
+             mock.patch.object(sys, "stdin", stdin), \
+             mock.patch("sys.stdout", new_callable=io.StringIO) as stdout, \
+             mock.patch("sys.stderr", new_callable=io.StringIO):
+            code = cli.main(["--resume", "cv.pdf", "--out", out, "--formats", "tex,docx"])
+            self.assertEqual(code, 0)
+            # Ids that map to the same file name get a suffix instead of overwriting each other
+            self.assertEqual(sorted(os.listdir(out)), ["Acme_role_1-3.docx", "Acme_role_1-3.tex",
+                                                       "acme_role_1-2.docx", "acme_role_1-2.tex",
+                                                       "acme_role_1.docx", "acme_role_1.tex"])
+        self.assertIn("acme/role 1", stdout.getvalue())
+        self.assertIn("tokens=3", stdout.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
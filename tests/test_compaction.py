@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compaction_utils
+
+JD = """Senior Python Engineer
+
+About the role:
+We   build   data pipelines.
+
+
+
+Requirements:
+- Python
+- AWS
+
+Benefits
+- Health insurance
+- Unlimited PTO
+
+How to apply
+Send your CV.
+
+Acme is an equal opportunity employer. We consider all applicants without regard to race or religion.
+
+Acme is an equal opportunity employer. We consider all applicants without regard to race or religion."""
+
+class TestCompaction(unittest.TestCase):
+
+    def test_boilerplate_removed(self):
+        cv, jd, report = compaction_utils.compact_inputs("Jane Doe\njane@x.com\nPage 1 of 2\nJane Doe\nPython", JD, "Gemini")
+        self.assertIn("- Python", jd)
+        self.assertIn("How to apply", jd)
+        self.assertIn("We build data pipelines.", jd)
+        self.assertNotIn("equal opportunity", jd)
+        self.assertNotIn("Health insurance", jd)
+        self.assertNotIn("\n\n\n", jd)
+        # Running header and page marker dropped, first occurrence kept
+        self.assertEqual(cv, "Jane Doe\njane@x.com\nPython")
+        self.assertEqual(report["saved_tokens"], report["jd"]["before"] - report["jd"]["after"] + report["cv"]["before"] - report["cv"]["after"])
+        self.assertGreater(report["saved_tokens"], 0)
+
+    def test_single_newline_inputs_keep_content(self):
+        # Pasted JDs and PyPDF2 output often have no blank lines
+        jd = ("Senior Python Engineer\n- Build data pipelines on AWS\n"
+              "Acme is an equal opportunity employer. Apply by Friday.\nWe offer reasonable accommodations.")
+        cv = "Jane Doe\nSoftware Engineer\njane@x.com\nExperience\nSoftware Engineer, Acme\nSoftware Engineer\nChaired the Equal Opportunity hiring committee."
+        cv_out, jd_out, _ = compaction_utils.compact_inputs(cv, jd, "Gemini")
+        self.assertEqual(jd_out, "Senior Python Engineer\n- Build data pipelines on AWS\nApply by Friday.")
+        # A repeated title under Experience is content, not a running header
+        self.assertEqual(cv_out, cv)
+
+    def test_running_header_dropped_only_at_page_boundaries(self):
+        pages = "Jane Doe\njane@x.com\nPython\n2 / 3\nJane Doe\njane@x.com\nAWS\nJane Doe"
+        self.assertEqual(compaction_utils.remove_boilerplate(pages), "Jane Doe\njane@x.com\nPython\nAWS\nJane Doe")
+
+    def test_budget_caps_sections(self):
+        cv = "\n".join(f"Line {i}: shipped feature number {i} to production" for i in range(500))
+        out, _, report = compaction_utils.compact_inputs(cv, "jd", "Gemini", cv_budget=100)
+        self.assertLessEqual(report["cv"]["after"], 100)
+        self.assertTrue(out.startswith("Line 0:"))
+        self.assertEqual(report["cv"]["budget"], 100)
+        # A budget of 0 disables the cap
+        out, _, _ = compaction_utils.compact_inputs(cv, "jd", "Gemini", cv_budget=0)
+        self.assertEqual(out.count("\n"), 499)
+
+if __name__ == '__main__':
+    unittest.main()
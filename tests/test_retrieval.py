@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import retrieval_utils
+
+CV = "\n".join(
+    ["Built Kubernetes operators in Go for multi-region failover"]
+    + [f"Filler role {i}: organised meetings and wrote weekly status reports for the office team" for i in range(30)]
+    + ["Led migration of Python services to AWS Lambda, cutting cost 40%"]
+)
+
+class TestRetrieval(unittest.TestCase):
+
+    def test_tokenize_keeps_tech_terms(self):
+        self.assertEqual(retrieval_utils.tokenize("C++, C# and Node.js."), ["c++", "c#", "node.js"])
+        self.assertEqual(retrieval_utils.parse_skills("Python, AWS; Go and Kubernetes"), ["Python", "AWS", "Go", "Kubernetes"])
+
+    def test_top_k_passages(self):
+        text, info = retrieval_utils.select_passages(CV, "Kubernetes, AWS, Python", top_k=2)
+        self.assertEqual(info["selected"], 2)
+        self.assertGreater(info["chunks"], 2)
+        self.assertIn("Kubernetes operators", text)
+        self.assertIn("AWS Lambda", text)
+        self.assertNotIn("Filler role 10", text)
+        # Index is cached per CV hash
+        self.assertIs(retrieval_utils.get_index(CV), retrieval_utils.get_index(CV))
+        # Short CVs go through whole
+        self.assertEqual(retrieval_utils.select_passages("Python dev", "Python", top_k=2)[0], "Python dev")
+
+    def test_list_valued_skills(self):
+        # Step 1 may return skills as a JSON array
+        as_list = retrieval_utils.select_passages(CV, ["Kubernetes", "AWS", "Python"], top_k=2)
+        self.assertEqual(as_list, retrieval_utils.select_passages(CV, "Kubernetes, AWS, Python", top_k=2))
+
+    def test_match_report_is_deterministic(self):
+        report = retrieval_utils.match_report(CV, "Python, AWS Lambda, Rust, team leadership")
+        self.assertEqual(report["matched"], ["Python", "AWS Lambda"])
+        self.assertEqual(report["missing"], ["Rust", "team leadership"])
+        self.assertEqual(report["score"], 50)
+        self.assertEqual(retrieval_utils.match_report(CV, "Python, AWS Lambda, Rust, team leadership"), report)
+
+if __name__ == '__main__':
+    unittest.main()
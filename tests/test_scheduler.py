@@ -0,0 +1,148 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_utils
+import scheduler_utils
+import stub_server
+import telemetry_utils
+import utils
+
+USER_INFO = {"name": "Test User", "email": "t@example.com", "phone": "1", "linkedin": "in/test", "address": "1 St"}
+
+class StatusError(Exception):
+    def __init__(self, status, headers=None, code=""):
+        super().__init__(f"Error code: {status} {code}")
+        self.status_code = status
+        self.response = SimpleNamespace(headers=headers or {})
+
+class FakeBackend:
+    provider = "OpenAI"
+    base_url = None
+
+    def __init__(self, keys):
+        self.api_keys = keys
+        self.key_index = 0
+        self.api_key = keys[0]
+
+    def next_key(self):
+        return utils.LLMBackend.next_key(self)
+
+    def use_key(self, api_key):
+        self.api_key = api_key
+
+def run(coro):
+    return asyncio.run(coro)
+
+class TestScheduler(unittest.TestCase):
+    def test_classification_and_retry_after(self):
+        self.assertEqual(scheduler_utils.classify_error(StatusError(503)), "retry")
+        self.assertEqual(scheduler_utils.classify_error(StatusError(429)), "retry")
+        self.assertEqual(scheduler_utils.classify_error(StatusError(401)), "failover")
+        self.assertEqual(scheduler_utils.classify_error(StatusError(429, code="insufficient_quota")), "failover")
+        self.assertEqual(scheduler_utils.classify_error(StatusError(400)), "fatal")
+        self.assertEqual(scheduler_utils.classify_error(TimeoutError("timed out")), "fatal")
+
+        self.assertEqual(scheduler_utils.retry_after(StatusError(429, {"retry-after-ms": "250"})), 0.25)
+        self.assertEqual(scheduler_utils.retry_after(StatusError(429, {"retry-after": "2"})), 2.0)
+        self.assertIsNone(scheduler_utils.retry_after(StatusError(429)))
+        self.assertEqual(scheduler_utils.backoff_delay(1, 99), scheduler_utils.BACKOFF_MAX)
+        self.assertLessEqual(scheduler_utils.backoff_delay(3), scheduler_utils.BACKOFF_BASE * 4)
+
+    def test_retry_then_failover(self):
+        backend = FakeBackend(["sk-a", "sk-b"])
+        step = telemetry_utils.new_step()
+        seen = []
+
+        async def call():
+            seen.append(backend.api_key)
+            if backend.api_key == "sk-a":
+                raise StatusError(429, {"retry-after-ms": "1"})
+            return "ok"
+
+        self.assertEqual(run(scheduler_utils.run_call(backend, call, step)), "ok")
+        self.assertEqual(seen, ["sk-a"] * (1 + scheduler_utils.CALL_RETRIES) + ["sk-b"])
+        self.assertEqual(step["retries"], scheduler_utils.CALL_RETRIES)
+        self.assertEqual(step["failovers"], 1)
+
+        # A fatal error is raised at once
+        async def bad():
+            raise StatusError(400)
+        with self.assertRaises(StatusError):
+            run(scheduler_utils.run_call(FakeBackend(["sk-a"]), bad, telemetry_utils.new_step()))
+
+    def test_duplicate_keys_tried_once(self):
+        backend = utils.OpenAIBackend(["sk-c", "sk-a", "sk-a"])
+        self.assertEqual(backend.api_keys, ["sk-c", "sk-a"])
+        step = telemetry_utils.new_step()
+        seen = []
+
+        async def call():
+            seen.append(backend.api_key)
+            raise StatusError(401)
+
+        with self.assertRaises(StatusError):
+            run(scheduler_utils.run_call(backend, call, step))
+        self.assertEqual(seen, ["sk-c", "sk-a"])
+        self.assertEqual(step["failovers"], 1)
+
+        # Even a list the backend didn't dedupe ends after the last position
+        backend = FakeBackend(["sk-a", "sk-b", "sk-b"])
+        self.assertTrue(backend.next_key())
+        self.assertTrue(backend.next_key())
+        self.assertFalse(backend.next_key())
+
+    def test_stream_not_repeated_after_first_delta(self):
+        backend = FakeBackend(["sk-a"])
+        opened = []
+
+        async def deltas():
+            opened.append(1)
+            if len(opened) == 1:
+                raise StatusError(503, {"retry-after-ms": "1"})
+            yield "Dear "
+            raise StatusError(503)
+
+        async def collect():
+            out = []
+            async for delta in scheduler_utils.run_stream(backend, deltas, telemetry_utils.new_step()):
+                out.append(delta)
+            return out
+
+        with self.assertRaises(StatusError):
+            run(collect())
+        self.assertEqual(len(opened), 2)
+
+class TestSchedulerChain(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._dir_patch = mock.patch.object(cache_utils, "CACHE_DIR", self._tmp.name)
+        self._dir_patch.start()
+        utils._step1_cache.reload()
+        self.server = stub_server.start_stub_server(fail_every=2, error_status=503, completion_tokens=20)
+
+    def tearDown(self):
+        self.server.stop()
+        self._dir_patch.stop()
+        utils._step1_cache.reload()
+        utils._step2_cache.clear()
+        utils._draft_cache.clear()
+        self._tmp.cleanup()
+
+    def test_chain_resumes_failed_step(self):
+        result = utils.generate_cover_letter("cv", "jd", "sk-local", "OpenAI", USER_INFO, "stub-model",
+                                             use_cache=False, base_url=self.server.url)
+        self.assertTrue(result["ok"], result.get("error"))
+        # Requests 2 and 4 failed; only those calls were repeated
+        self.assertEqual(self.server.stats["requests"], 5)
+        steps = result["usage"]["steps"]
+        self.assertEqual([steps[s]["retries"] for s in ("extract", "match", "draft")], [0, 1, 1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_utils
+import scheduler_utils
+import stub_server
+import utils
+
+USER_INFO = {"name": "Test User", "email": "t@example.com", "phone": "1", "linkedin": "in/test", "address": "1 St"}
+
+class TestStubBackend(unittest.TestCase):
+    """Full pipeline over HTTP against the local OpenAI-compatible stub."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._dir_patch = mock.patch.object(cache_utils, "CACHE_DIR", self._tmp.name)
+        self._dir_patch.start()
+        utils._step1_cache.reload()
+        self.server = None
+
+    def tearDown(self):
+        if self.server:
+            self.server.stop()
+        self._dir_patch.stop()
+        utils._step1_cache.reload()
+        utils._step2_cache.clear()
+        utils._draft_cache.clear()
+        self._tmp.cleanup()
+
+    def generate(self, **kwargs):
+        return utils.generate_cover_letter("cv", "jd", "sk-local", "OpenAI", USER_INFO, "stub-model", "Jan 1",
+                                           base_url=self.server.url, **kwargs)
+
+    def test_pipeline_against_stub(self):
+        self.server = stub_server.start_stub_server(completion_tokens=50)
+        result = self.generate()
+        self.assertTrue(result["ok"], result.get("error"))
+        self.assertEqual(self.server.stats["requests"], 3)
+        self.assertEqual(result["hr_info_debug"]["company"], "Stub Corp")
+        self.assertTrue(result["text"].startswith("Test User\n1 St | t@example.com | 1\nin/test\n\nJan 1"))
+        self.assertGreater(result["usage"]["total_tokens"], 100)
+        steps = result["usage"]["steps"]
+        self.assertEqual(sorted(steps), ["draft", "extract", "match"])
+        for step in steps.values():
+            self.assertEqual(step["calls"], 1)
+            self.assertGreater(step["prompt_tokens"], 0)
+            self.assertIsNotNone(step["ttfb"])
+        self.assertEqual(result["usage"]["completion_tokens"], sum(s["completion_tokens"] for s in steps.values()))
+        # "stub-model" has no price
+        self.assertIsNone(result["usage"]["cost_est"])
+        # Deterministic: same request, same letter
+        self.assertEqual(self.generate(use_cache=False)["text"], result["text"])
+
+    def test_streaming_and_fused(self):
+        self.server = stub_server.start_stub_server(completion_tokens=40, chunk_tokens=5)
+        stream = utils.generate_cover_letter_stream("cv", "jd", "sk-local", "OpenAI", USER_INFO, "stub-model",
+                                                    base_url=self.server.url)
+        deltas = list(stream)
+        self.assertGreater(len(deltas), 5)
+        self.assertEqual("".join(deltas), stream.result["text"])
+        fused = self.generate(mode="fused")
+        self.assertTrue(fused["ok"])
+        self.assertNotIn("fallback", fused["usage"])
+
+    def test_error_injection(self):
+        self.server = stub_server.start_stub_server(fail_every=1, error_status=503)
+        result = self.generate()
+        self.assertFalse(result["ok"])
+        self.assertIn("Step 1 (Extraction) failed", result["error"])
+        # Every scheduler retry hit the stub (retry-after-ms keeps them quick)
+        self.assertEqual(self.server.stats["errors"], 1 + scheduler_utils.CALL_RETRIES)
+        with self.assertRaises(ValueError):
+            stub_server.stub_config(latncy=1)
+
+if __name__ == '__main__':
+    unittest.main()
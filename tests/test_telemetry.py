@@ -0,0 +1,57 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telemetry_utils
+
+def make_usage(model="gpt-4o"):
+    steps = {}
+    for name, (prompt, completion, hit) in {"extract": (1000, 100, False), "match": (0, 0, True),
+                                             "draft": (2000, 500, False)}.items():
+        step = telemetry_utils.new_step()
+        step.update({"wall": 0.1234, "prompt_tokens": prompt, "completion_tokens": completion,
+                     "total_tokens": prompt + completion, "calls": 0 if hit else 1, "cache_hit": hit})
+        steps[name] = step
+    return {"mode": "chain", "timings": {"total": 0.5}, "steps": steps, "cache_hits": ["match"]}
+
+class TestTelemetry(unittest.TestCase):
+    def test_pricing_lookup(self):
+        self.assertEqual(telemetry_utils.model_price("gpt-4o-mini-2024-07-18"), telemetry_utils.PRICING["gpt-4o-mini"])
+        self.assertEqual(telemetry_utils.model_price("models/gemini-1.5-flash-001"), telemetry_utils.PRICING["gemini-1.5-flash"])
+        self.assertIsNone(telemetry_utils.model_price("stub-model"))
+        self.assertAlmostEqual(telemetry_utils.estimate_cost("gpt-4o", 1_000_000, 0), telemetry_utils.PRICING["gpt-4o"][0])
+
+    def test_finalize_usage(self):
+        usage = telemetry_utils.finalize_usage(make_usage(), "gpt-4o")
+        self.assertEqual(usage["prompt_tokens"], 3000)
+        self.assertEqual(usage["completion_tokens"], 600)
+        self.assertEqual(usage["total_tokens"], 3600)
+        self.assertEqual(usage["steps"]["extract"]["wall"], 0.123)
+        self.assertEqual(usage["steps"]["match"]["cost"], 0.0)
+        self.assertAlmostEqual(usage["cost_est"], telemetry_utils.estimate_cost("gpt-4o", 3000, 600), places=6)
+        self.assertIsNone(telemetry_utils.finalize_usage(make_usage(), "my-local-model")["cost_est"])
+
+    def test_records_summary_and_export(self):
+        usage = telemetry_utils.finalize_usage(make_usage(), "gpt-4o")
+        records = [telemetry_utils.record_from_result({"ok": True, "usage": usage}, "OpenAI", "job-1"),
+                   telemetry_utils.record_from_result({"ok": False, "error": "boom", "usage": {}}, "OpenAI", "job-2")]
+        summary = telemetry_utils.summarize_records(records)
+        self.assertEqual(summary["failures"], 1)
+        self.assertEqual(summary["total_tokens"], 3600)
+        self.assertEqual(summary["steps"]["match"]["cache_hits"], 1)
+        self.assertIsNone(summary["steps"]["match"]["mean_wall"])
+        self.assertNotIn("fused", summary["steps"])
+
+        lines = telemetry_utils.export_records(records).splitlines()
+        self.assertEqual(json.loads(lines[0])["draft_prompt_tokens"], 2000)
+        csv_text = telemetry_utils.export_records(records, "csv")
+        self.assertIn("extract_ttfb", csv_text.splitlines()[0])
+        self.assertEqual(len(csv_text.strip().splitlines()), 3)
+        with self.assertRaises(ValueError):
+            telemetry_utils.export_records(records, "xml")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,14 @@
 import sys
 import os
+import tempfile
+import threading
 import unittest
+import zipfile
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cache_utils
 import export_utils
 from io import BytesIO
+from unittest import mock
 
 class TestExports(unittest.TestCase):
     def setUp(self):
@@ -40,5 +45,204 @@ class TestExports(unittest.TestCase):
         self.assertIn("\\documentclass", code)
         self.assertIn("Test User", code)
 
+class TestMarkdownSegments(unittest.TestCase):
+    def test_inline_styles(self):
+        B, I = export_utils.BOLD, export_utils.ITALIC
+        runs = lambda text: export_utils.parse_markdown_to_segments(text)[0][1]
+        self.assertEqual(runs("A **bold** and *it* end"), (("A ", 0), ("bold", B), (" and ", 0), ("it", I), (" end", 0)))
+        self.assertEqual(runs("***both*** x"), (("both", B | I), (" x", 0)))
+        self.assertEqual(runs("*a **b** c*"), (("a ", I), ("b", B | I), (" c", I)))
+        # Markers that never open or close stay literal
+        self.assertEqual(runs("3 * 4 * 5"), (("3 * 4 * 5", 0),))
+        self.assertEqual(runs("x **y"), (("x **y", 0),))
+
+    def test_lines_bullets_and_breaks(self):
+        segments = export_utils.parse_markdown_to_segments("\n\nDear Team,\nLine two\n\n\n* one\n- **two**\n\n")
+        self.assertEqual(segments, (("line", (("Dear Team,", 0),)), ("line", (("Line two", 0),)), ("break", None),
+                                    ("bullet", (("one", 0),)), ("bullet", (("two", export_utils.BOLD),))))
+        self.assertIs(export_utils.parse_markdown_to_segments("\n\nDear Team,\nLine two\n\n\n* one\n- **two**\n\n"), segments)
+        self.assertEqual(export_utils.parse_markdown_to_segments(""), ())
+
+    def test_exporters_render_the_same_segments(self):
+        from docx import Document
+        data = {"body": "Dear Team,\n\nA **bold** and *italic* word: 50% & more.\n\n* Point 1\n* Point 2\n\nBye",
+                "user_info": {"full_name": "T"}}
+        _, latex = export_utils.create_latex(data)
+        self.assertIn(r"A \textbf{bold} and \textit{italic} word: 50\% \& more.", latex)
+        self.assertIn("\\begin{itemize}\n  \\item Point 1\n  \\item Point 2\n\\end{itemize}\n\nBye", latex)
+
+        paragraphs = Document(export_utils.create_docx(data)).paragraphs[3:]
+        self.assertEqual([r.text for r in paragraphs[1].runs if r.bold], ["bold"])
+        self.assertEqual([r.text for r in paragraphs[1].runs if r.italic], ["italic"])
+        self.assertEqual([p.style.name for p in paragraphs], ["Normal", "Normal", "List Bullet", "List Bullet", "Normal"])
+
+        with mock.patch.object(export_utils, "PDF_FONT_PATH", "missing.ttf"):
+            pdf = export_utils.create_pdf(data).getvalue()
+        self.assertIn(b"Helvetica-Bold", pdf)
+        self.assertIn(b"Helvetica-Oblique", pdf)
+
+class TestDocxTemplate(unittest.TestCase):
+    def setUp(self):
+        export_utils._docx_templates.clear()
+        self.user_info = {"full_name": "Test User", "email": "test@example.com", "address": "1 St"}
+
+    def test_header_template_built_once_per_profile(self):
+        from docx import Document
+        with mock.patch.object(export_utils, "_build_docx_template",
+                               wraps=export_utils._build_docx_template) as build:
+            first = export_utils.create_docx({"body": "Dear Team,\n\n**Hello** there.\n* Point", "user_info": self.user_info})
+            second = export_utils.create_docx({"body": "Other letter", "user_info": dict(self.user_info)})
+            self.assertEqual(build.call_count, 1)
+            export_utils.create_docx({"body": "x", "user_info": dict(self.user_info, email="new@example.com")})
+            self.assertEqual(build.call_count, 2)
+
+        doc = Document(first)
+        texts = [p.text for p in doc.paragraphs]
+        self.assertEqual(texts[:2], ["Test User", "1 St • test@example.com"])
+        self.assertEqual(texts[3:], ["Dear Team,", "Hello there.", "Point"])
+        self.assertTrue(doc.paragraphs[0].runs[0].bold)
+        self.assertEqual([r.text for r in doc.paragraphs[4].runs if r.bold], ["Hello"])
+        self.assertEqual(doc.paragraphs[5].style.name, "List Bullet")
+        # Renders never write into the cached template
+        self.assertEqual([p.text for p in Document(second).paragraphs][3:], ["Other letter"])
+        template = export_utils.docx_template(self.user_info)
+        self.assertEqual(len(Document(BytesIO(template["bytes"])).paragraphs), 3)
+
+SYSTEM_FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+@unittest.skipUnless(os.path.exists(SYSTEM_FONT), "DejaVuSans.ttf not installed")
+class TestPdfFontCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._patches = [mock.patch.object(cache_utils, "CACHE_DIR", self._tmp.name),
+                         mock.patch.object(export_utils, "PDF_FONT_PATH", SYSTEM_FONT),
+                         mock.patch.dict(export_utils._font_assets, clear=True)]
+        for patch in self._patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self._patches):
+            patch.stop()
+        self._tmp.cleanup()
+
+    def test_core_font_built_once_and_used_when_it_covers_the_text(self):
+        asset = export_utils.preload_pdf_assets()
+        self.assertTrue(asset["path"].startswith(self._tmp.name))
+        self.assertIn(ord("é"), asset["chars"])
+        with mock.patch.object(export_utils, "_build_core_font") as build:
+            self.assertIs(export_utils.core_font(), asset)
+            build.assert_not_called()
+
+        self.assertEqual(export_utils._pdf_font_file("Café — “quoted” •"), asset["path"])
+        # Text outside the core ranges falls back to the full font file
+        self.assertEqual(export_utils._pdf_font_file("Привет 日本"), SYSTEM_FONT)
+        pdf = export_utils.create_pdf({"body": "Dear Team,\n\nCafé — “quoted”."}).getvalue()
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        self.assertIn(b"DejaVu", pdf)
+
+class TestExportManager(unittest.TestCase):
+    def setUp(self):
+        export_utils._render_cache.clear()
+        self.data = {"body": "Dear Team,\n\nHello **there**.", "user_info": {"full_name": "T"},
+                     "date_str": "Jan 1", "hr_info": {}}
+
+    def test_renders_on_demand_and_memoizes(self):
+        calls = []
+        renderers = {fmt: (lambda fn, fmt=fmt: lambda data: calls.append(fmt) or fn(data))(fn)
+                     for fmt, fn in export_utils.RENDERERS.items()}
+        manager = export_utils.ExportManager()
+        with mock.patch.dict(export_utils.RENDERERS, renderers):
+            manager.update(self.data)
+            self.assertEqual(calls, [])
+            self.assertFalse(manager.ready("pdf"))
+            self.assertTrue(manager.get("pdf").startswith(b"%PDF"))
+            self.assertTrue(manager.ready("pdf"))
+            # Same letter again (e.g. a rerun without edits): no new render
+            manager.update(dict(self.data))
+            manager.get("pdf")
+            self.assertEqual(calls, ["pdf"])
+            # A different profile is a different key
+            manager.update(dict(self.data, user_info={"full_name": "Other"}))
+            self.assertFalse(manager.ready("pdf"))
+        with self.assertRaises(ValueError):
+            export_utils.render_export(self.data, "rtf")
+
+    def test_background_prefetch_skips_stale_content(self):
+        pool = export_utils._get_export_pool()
+        gate = threading.Event()
+        pool.submit(gate.wait)  # hold the worker until both edits are queued
+        manager = export_utils.ExportManager()
+        manager.update(self.data, prefetch=["tex", "docx"])
+        edited = dict(self.data, body="Edited")
+        manager.update(edited, prefetch=["tex"])
+        gate.set()
+        pool.submit(lambda: None).result()  # drain the queue
+        self.assertTrue(manager.ready("tex"))
+        self.assertFalse(manager.ready("docx"))
+        key = export_utils.content_key(self.data)
+        self.assertNotIn(key + ("docx",), export_utils._render_cache)
+
+class TestBulkExport(unittest.TestCase):
+    def letters(self, count, produced=None):
+        for i in range(count):
+            if produced is not None:
+                produced.append(i)
+            yield f"job{i}", {"body": f"Dear Team,\n\nLetter **{i}**.", "user_info": {"full_name": "T"}}
+
+    def test_writes_directory_and_zip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            export = export_utils.export_letters(self.letters(3), ["tex", "docx"], tmp, parallel=False)
+            items = list(export)
+            self.assertEqual([i["name"] for i in items], ["job0", "job1", "job2"])
+            self.assertEqual(sorted(os.listdir(tmp)), ["job0.docx", "job0.tex", "job1.docx", "job1.tex", "job2.docx", "job2.tex"])
+            self.assertEqual(export.stats["letters"], 3)
+            self.assertEqual(export.stats["files"], 6)
+            self.assertGreater(export.stats["letters_per_sec"], 0)
+
+            archive = os.path.join(tmp, "out", "letters.zip")
+            with mock.patch.object(export_utils, "EXPORT_WORKERS", 2):
+                export = export_utils.export_letters(self.letters(5), ["pdf", "tex"], archive, window=2)
+                self.assertTrue(export.parallel)
+                list(export)
+            with zipfile.ZipFile(archive) as z:
+                self.assertEqual(len(z.namelist()), 10)
+                self.assertTrue(z.read("job4.pdf").startswith(b"%PDF"))
+                self.assertIn(b"\\textbf{4}", z.read("job4.tex"))
+                self.assertEqual(z.getinfo("job4.pdf").compress_type, zipfile.ZIP_STORED)
+
+    def test_duplicate_names_get_a_suffix(self):
+        letters = [("job", {"body": str(i)}) for i in range(3)] + [("JOB", {"body": "3"})]
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = os.path.join(tmp, "letters.zip")
+            items = list(export_utils.export_letters(letters, ["tex"], archive, parallel=False))
+            self.assertEqual([i["files"] for i in items], [["job.tex"], ["job-2.tex"], ["job-3.tex"], ["JOB-4.tex"]])
+            with zipfile.ZipFile(archive) as z:
+                self.assertEqual(len(set(z.namelist())), 4)
+                self.assertIn(b"2", z.read("job-3.tex"))
+            items = list(export_utils.export_letters(letters[:2], ["tex"], tmp, parallel=False))
+            self.assertEqual(sorted(f for f in os.listdir(tmp) if f.endswith(".tex")), ["job-2.tex", "job.tex"])
+
+    def test_window_bounds_letters_in_flight(self):
+        produced = []
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(export_utils, "EXPORT_WORKERS", 2):
+            export = iter(export_utils.export_letters(self.letters(20, produced), ["tex"], tmp, window=3))
+            next(export)
+            self.assertLessEqual(len(produced), 3)
+            self.assertEqual(len(list(export)), 19)
+
+    def test_failed_letter_is_reported(self):
+        def broken(data):
+            if "1" in data["body"]:
+                raise RuntimeError("boom")
+            return b"ok"
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(export_utils.RENDERERS, {"tex": broken}):
+            export = export_utils.export_letters(self.letters(2), ["tex"], tmp, parallel=False)
+            items = list(export)
+            self.assertEqual(items[1]["error"], "boom")
+            self.assertEqual(export.stats["failed"], 1)
+            self.assertEqual(os.listdir(tmp), ["job0.tex"])
+        with self.assertRaises(ValueError):
+            export_utils.export_letters([], ["rtf"], "out")
+
 if __name__ == '__main__':
     unittest.main()